@@ -1,22 +1,28 @@
 import sqlite3
-import pandas as pd
 import re
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
 from time import perf_counter
+from parquet_candidates import ParquetCandidates
+from excel_cache import read_sheet
+from precompute_split_items import has_column, parse_split, split_item_tokens
+from address_normalizer import normalize_basic
+
+# --- Configuration ---
+CANDIDATE_SOURCE = "sqlite"  # "sqlite" (all of data_df) or "parquet" (dataset written by convert)
+PARQUET_PATH = "C:/Users/User/Desktop/Core_2025_dataset"
+DB_PATH = "C:/Users/User/Desktop/Core.sqlite"  # run precompute_split_items.py once so candidates skip parsing split
 
 # --- Start Timer ---
 start_time = perf_counter()
 
 # --- Precompiled Regex ---
-non_word_re = re.compile(r"[^\w\s/]")
-multi_space_re = re.compile(r"\s+")
 duplicate_postcode_re = re.compile(r'(\b\d{5}\b)(\s+\1)+')
 
 # --- Utility Functions ---
 def clean_string(s):
-    s = str(s).lower()
-    s = non_word_re.sub(" ", s)
-    s = multi_space_re.sub(" ", s)
-    return s.strip()
+    return normalize_basic(s)
 
 def remove_duplicate_postcode(text):
     return duplicate_postcode_re.sub(r'\1', text)
@@ -28,48 +34,75 @@ def jaccard_similarity(set1, set2):
 
 # --- Load input Excel ---
 input_path = "C:/Users/User/Desktop/Tera.xlsx"
-df = pd.read_excel(input_path)
-
-# --- Connect to SQLite DB ---
-conn = sqlite3.connect("C:/Users/User/Desktop/Core.sqlite")
-cursor = conn.cursor()
-
-# --- Process rows ---
-results = []
-
-for _, row in df.iterrows():
-    full_address = str(row["full_address"])
-    postcode = str(row["postcode"]).strip()
-
+df = read_sheet(input_path)
+
+# --- Candidate Source ---
+def fetch_candidates_parquet(postcodes):
+    # convert only exports data_date 202501-202512, so this source never sees the
+    # other years sqlite scores against; inputs whose only good candidate is
+    # outside 2025 stay unmatched here
+    parquet_source = ParquetCandidates(PARQUET_PATH, columns=("LL", "split"))
+    for postcode in postcodes:
+        yield postcode, [(ll, parse_tokens(split_raw)) for ll, split_raw in parquet_source.fetch(postcode)]
+
+def fetch_candidates_sqlite(postcodes):
+    # Input postcodes go into a temp table and one join streams every candidate,
+    # grouped by postcode, instead of one query per input row
+    conn = sqlite3.connect(DB_PATH)
+    use_items = has_column(conn, "data_df", "split_items")
+    conn.execute("CREATE TEMP TABLE input_postcodes (postcode TEXT PRIMARY KEY)")
+    conn.executemany("INSERT INTO input_postcodes VALUES (?)", [(p,) for p in postcodes])
+    # split is only read back where split_items is still NULL (rows added after
+    # precompute_split_items last ran), those fall back to parsing it
+    items = "d.split_items, CASE WHEN d.split_items IS NULL THEN d.split END" if use_items else "NULL, d.split"
+    rows = conn.execute(f"""
+        SELECT p.postcode, d.LL, {items}
+        FROM input_postcodes p
+        JOIN data_df d ON d.postcode = p.postcode
+        ORDER BY p.postcode, d.rowid
+    """)
+    for postcode, group in groupby(rows, key=itemgetter(0)):
+        yield postcode, [(ll, candidate_tokens(split_items, split_raw)) for _, ll, split_items, split_raw in group]
+    conn.close()
+
+def parse_tokens(split_raw):
+    items = parse_split(split_raw)
+    return set(items) if items is not None else None
+
+def candidate_tokens(split_items, split_raw):
+    return split_item_tokens(split_items) if split_items is not None else parse_tokens(split_raw)
+
+# --- Group inputs by postcode ---
+results = [("", "", 0)] * len(df)
+inputs_by_postcode = defaultdict(lambda: defaultdict(list))
+
+for pos, (full_address, postcode) in enumerate(zip(df["full_address"].astype(str), df["postcode"].astype(str).str.strip())):
     if not postcode or not full_address:
-        results.append(("", "", 0))
         continue
-
     cleaned_input = clean_string(remove_duplicate_postcode(full_address))
-    input_tokens = set(cleaned_input.split())
-
-    cursor.execute("""
-        SELECT LL, split FROM data_df WHERE postcode = ?
-    """, (postcode,))
-    candidates = cursor.fetchall()
-
-    best = None
-    best_score = 0
-
-    for ll, split_raw in candidates:
-        if not split_raw:
-            continue
-        try:
-            tokens = set(eval(split_raw)) if isinstance(split_raw, str) else set(split_raw)
-        except:
-            continue
-
-        score = jaccard_similarity(input_tokens, tokens)
-        if score >= 0.70 and score > best_score:
-            best_score = score
-            best = (ll, " ".join(sorted(tokens)), round(score * 100, 2))
-
-    results.append(best if best else ("", "", 0))
+    # Rows with the same token set under one postcode share a result
+    inputs_by_postcode[postcode][frozenset(cleaned_input.split())].append(pos)
+
+# --- Process postcodes ---
+fetch_candidates = fetch_candidates_parquet if CANDIDATE_SOURCE == "parquet" else fetch_candidates_sqlite
+
+for postcode, candidates in fetch_candidates(list(inputs_by_postcode)):
+    # Each postcode's candidates are scored once for all of its inputs
+    for input_tokens, positions in inputs_by_postcode[postcode].items():
+        best = None
+        best_score = 0
+
+        for ll, tokens in candidates:
+            if tokens is None:
+                continue
+            score = jaccard_similarity(input_tokens, tokens)
+            if score >= 0.70 and score > best_score:
+                best_score = score
+                best = (ll, " ".join(sorted(tokens)), round(score * 100, 2))
+
+        if best:
+            for pos in positions:
+                results[pos] = best
 
 # --- Save results to DataFrame ---
 df["LL"] = [r[0] for r in results]
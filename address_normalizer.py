@@ -0,0 +1,103 @@
+import re
+import pandas as pd
+
+# --- Profiles ---
+# Each script grew its own clean_string. The profiles below reproduce them
+# exactly (bench_normalizer.py checks this and times them against the originals):
+#   basic   tier-2, Tera, test_2.clean_string   lower, non-word runs -> " "
+#   alnum   test_2.clean_address                lower, non [a-z0-9/] runs -> " "
+#   tier1   test_1                              punctuation, short forms, dedupe words
+#   abbrev  zus, av_model                       punctuation, abbreviations, split trailing number, dedupe words
+
+PUNCTUATION = ",._;'{}[]\\?!*:\n"  # replaced by spaces in tier1/abbrev
+
+# test_1 replaces these before lowercasing and without word boundaries
+SHORT_FORMS = {"taman": "tmn", "lorong": "lrg", "kampung": "kg", "jalan": "jln"}
+
+ABBREVIATIONS = {
+    "sekolah menengah kebangsaan": "smk", "sekolah menengah": "smk",
+    "sekolah kebangsaan": "sk", "sekolah rendah kebangsaan": "srk",
+    "sekolah rendah": "sk", "sekolah jenis kebangsaan": "sjk",
+    "sekolah agama": "sra", "kolej vokasional": "kv",
+    "kolej komuniti": "kk", "kolej matrikulasi": "km",
+    "universiti teknologi mara": "uitm", "universiti kebangsaan malaysia": "ukm",
+    "universiti teknologi malaysia": "utm", "universiti sains malaysia": "usm",
+    "universiti putra malaysia": "upm", "universiti malaysia sabah": "ums",
+    "universiti malaya": "um", "maktab rendah sains mara": "mrsm",
+    "jalan": "jln", "lorong": "lrg", "kampung": "kg", "taman": "tmn"
+}
+
+def compile_replacements(replacements):
+    # Longest first, so "sekolah menengah kebangsaan" wins over "sekolah menengah"
+    # at the same position, like the ordered re.sub passes did
+    alternation = "|".join(re.escape(k) for k in sorted(replacements, key=len, reverse=True))
+    return re.compile(rf"\b(?:{alternation})\b")
+
+basic_re = re.compile(r"[^\w/]+")
+alnum_re = re.compile(r"[^a-z0-9/]+")
+abbreviations_re = compile_replacements(ABBREVIATIONS)
+trailing_number_re = re.compile(r"(\d+)$")
+
+def strip_punctuation(text):
+    # One str.replace per character is several times faster than str.translate with a dict
+    for ch in PUNCTUATION:
+        text = text.replace(ch, " ")
+    return text
+
+def dedupe_words(s):
+    seen = set()
+    return " ".join([w for w in s.split() if not (w in seen or seen.add(w))])
+
+# --- Scalar ---
+
+def normalize_basic(s):
+    return basic_re.sub(" ", str(s).lower()).strip()
+
+def normalize_alnum(text):
+    if not isinstance(text, str):
+        return ""
+    return alnum_re.sub(" ", text.lower()).strip()
+
+def normalize_tier1(text):
+    if not isinstance(text, str):
+        return ""
+    cleaned = strip_punctuation(text)
+    for long, short in SHORT_FORMS.items():
+        cleaned = cleaned.replace(long, short)  # plain substring replaces beat a regex callback here
+    return dedupe_words(cleaned.lower())
+
+def normalize_abbrev(text):
+    if not isinstance(text, str):
+        return ""
+    cleaned = abbreviations_re.sub(lambda m: ABBREVIATIONS[m.group()], strip_punctuation(text).lower())
+    cleaned = trailing_number_re.sub(r" \1", cleaned, count=1)  # "blok a12" -> "blok a 12"
+    return dedupe_words(cleaned)
+
+PROFILES = {
+    "basic": normalize_basic,
+    "alnum": normalize_alnum,
+    "tier1": normalize_tier1,
+    "abbrev": normalize_abbrev,
+}
+
+def normalize(text, profile="basic"):
+    return PROFILES[profile](text)
+
+# --- Batch ---
+
+def normalize_many(values, profile="basic"):
+    # Address columns repeat heavily (same building, same street), so each
+    # distinct string is normalized once and the results are gathered by code.
+    # Accepts a pandas Series, a pyarrow (Chunked)Array or any sequence and
+    # returns a Series aligned with the input.
+    normalize_one = PROFILES[profile]
+    if hasattr(values, "to_pandas"):
+        values = values.to_pandas()
+    if not isinstance(values, pd.Series):
+        values = pd.Series(values, dtype=object)
+    if pd.api.types.infer_dtype(values, skipna=False) != "string":
+        # Mixed types: 1 and 1.0 would share a code but not a result
+        return values.map(normalize_one).astype(object)
+    codes, uniques = pd.factorize(values)
+    cleaned = pd.Series([normalize_one(v) for v in uniques], dtype=object).to_numpy()
+    return pd.Series(cleaned[codes], index=values.index, dtype=object)
@@ -1,9 +1,12 @@
-import pandas as pd
 import re
 from collections import Counter
-from openpyxl import load_workbook
+from itertools import zip_longest
+from openpyxl import Workbook, load_workbook
 from openpyxl.utils import get_column_letter
 import csv
+import os
+from keyword_matcher import KeywordClassifier
+from excel_cache import read_sheet
 
 # === Define Category Keywords ===
 building_keywords = [
@@ -33,36 +36,81 @@ extra_keywords = [
     "hostel", "hotel", "jabatan", "balai", "terminal", "station", "resort", "guesthouse", "dorm", "asrama"
 ]
 
+CATEGORIES = {
+    "Building": building_keywords,
+    "Education": education_keywords,
+    "Mall": mall_keywords,
+    "Hospital": hospital_keywords,
+    "Extra name 5": extra_keywords,
+}
+
+# === Output ===
+WRITE_MODE = "sheet"  # "sheet" rewrites 'List Key' inside the workbook, "sidecar" writes it to its own file without loading the workbook
+LIST_KEY_COLUMNS = 10  # "sheet" only rewrites these columns of 'List Key', notes to their right are kept
+
 # === Utility Functions ===
+noisy_re = re.compile(r"jalan\s*\d+[a-z]?")
+
 def is_noisy(name):
     name = name.lower().strip()
-    return bool(re.fullmatch(r"jalan\s*\d+[a-z]?", name)) or ("jalan " in name and len(name.split()) <= 3)
+    return bool(noisy_re.fullmatch(name)) or ("jalan " in name and len(name.split()) <= 3)
+
+# Whole-word matches, same as re.search(rf"\b{k}\b") per keyword, for every category in one scan
+category_classifier = KeywordClassifier(CATEGORIES)
+
+def categorize_keys(keys):
+    found = {label: set() for label in CATEGORIES}
+    for key, labels in zip(keys, category_classifier.categories_many(keys)):
+        if labels and not is_noisy(key):
+            for label in labels:
+                found[label].add(key.strip())
+    return {label: sorted(names) for label, names in found.items()}
+
+def list_key_rows(table_data, kept_rows):
+    # table_data over the first LIST_KEY_COLUMNS columns, the kept cells to their right
+    for row, kept in zip_longest(table_data, kept_rows, fillvalue=()):
+        row = list(row) + [None] * (LIST_KEY_COLUMNS - len(row))
+        yield row + list(kept[len(row) - LIST_KEY_COLUMNS:])
+
+def write_list_key_sheet(filepath, table_data):
+    # The old sheet is replaced by one filled with ws.append, in the same
+    # position, with its column widths and the values past LIST_KEY_COLUMNS
+    wb = load_workbook(filepath)
+    kept_rows, widths, index = [], {}, len(wb.sheetnames)
+    if "List Key" in wb.sheetnames:
+        old = wb["List Key"]
+        index = wb.sheetnames.index("List Key")
+        if old.max_column > LIST_KEY_COLUMNS:
+            kept_rows = list(old.iter_rows(min_col=LIST_KEY_COLUMNS + 1, values_only=True))
+            while kept_rows and all(v is None for v in kept_rows[-1]):
+                kept_rows.pop()
+        widths = {key: dim.width for key, dim in old.column_dimensions.items() if dim.width}
+        wb.remove(old)
+    ws = wb.create_sheet("List Key", index)
+    for key, width in widths.items():
+        ws.column_dimensions[key].width = width
+    for row in list_key_rows(table_data, kept_rows):
+        ws.append(row)
+    wb.save(filepath)
 
-def extract_clean_names(keys, keyword_list):
-    found = set()
-    for key in keys:
-        key_lower = key.lower()
-        if any(re.search(rf"\b{re.escape(k)}\b", key_lower) for k in keyword_list):
-            if not is_noisy(key):
-                found.add(key.strip())
-    return sorted(found)
+def write_list_key_sidecar(path, table_data):
+    # Write-only workbooks stream rows straight to disk
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("List Key")
+    for row in table_data:
+        ws.append(row)
+    wb.save(path)
 
 # === Main Function ===
 def write_key_results(filepath="C:/Users/User/Desktop/Key_Check_List.xlsx"):
-    df = pd.read_excel(filepath, sheet_name="Reference")
+    df = read_sheet(filepath, sheet_name="Reference", usecols=[0])
     keys = df.iloc[:, 0].dropna().astype(str).tolist()
     counter = Counter(keys)
 
     most_key, _ = counter.most_common(1)[0]
     duplicates = [k for k, v in counter.items() if v > 1]
 
-    buildings = extract_clean_names(keys, building_keywords)
-    educations = extract_clean_names(keys, education_keywords)
-    malls = extract_clean_names(keys, mall_keywords)
-    hospitals = extract_clean_names(keys, hospital_keywords)
-    extras = extract_clean_names(keys, extra_keywords)
-
-    max_len = max(len(buildings), len(educations), len(malls), len(hospitals), len(extras))
+    categorized = categorize_keys(keys)
 
     # === Prepare Data Table ===
     headers = ["", "", "Building", "Education", "Mall", "Hospital", "Extra name 5", "Extra name 6", "Extra name 7", "Extra name 8"]
@@ -76,41 +124,22 @@ def write_key_results(filepath="C:/Users/User/Desktop/Key_Check_List.xlsx"):
     table_data.append(["list key duplicate", "; ".join(duplicates)])
 
     # Category values
-    for i in range(max_len):
-        row = ["", ""]
-        row.append(buildings[i] if i < len(buildings) else "")
-        row.append(educations[i] if i < len(educations) else "")
-        row.append(malls[i] if i < len(malls) else "")
-        row.append(hospitals[i] if i < len(hospitals) else "")
-        row.append(extras[i] if i < len(extras) else "")
-        table_data.append(row)
+    for names in zip_longest(*categorized.values(), fillvalue=""):
+        table_data.append(["", "", *names])
 
     # === Write to Excel ===
-    wb = load_workbook(filepath)
-    if "List Key" in wb.sheetnames:
-        ws = wb["List Key"]
+    if WRITE_MODE == "sidecar":
+        sidecar_path = os.path.splitext(filepath)[0] + "_List_Key.xlsx"
+        write_list_key_sidecar(sidecar_path, table_data)
+        print(f"✅ 'List Key' sheet written to: {sidecar_path}")
     else:
-        ws = wb.create_sheet("List Key")
-
-    # Clear existing
-    for row in ws.iter_rows(min_row=1, max_row=ws.max_row, max_col=10):
-        for cell in row:
-            cell.value = None
-
-    # Fill Excel cells
-    for row_idx, row_data in enumerate(table_data, start=1):
-        for col_idx, val in enumerate(row_data, start=1):
-            ws.cell(row=row_idx, column=col_idx).value = val
-
-    wb.save(filepath)
-    print("✅ Excel file updated: 'List Key' sheet written.")
+        write_list_key_sheet(filepath, table_data)
+        print("✅ Excel file updated: 'List Key' sheet written.")
 
     # === Write to CSV ===
     csv_path = "C:/Users/User/Desktop/List_Key.csv"
     with open(csv_path, mode="w", encoding="utf-8", newline="") as f:
-        writer = csv.writer(f)
-        for row in table_data:
-            writer.writerow(row)
+        csv.writer(f).writerows(table_data)
 
     print(f"✅ CSV file saved to: {csv_path}")
 
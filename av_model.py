@@ -1,100 +1,271 @@
 import pandas as pd
-import re
+import numpy as np
+import os
+import hashlib
+import shutil
+import joblib
+from scipy.sparse import csr_matrix
 from time import perf_counter
 from datetime import timedelta
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from tqdm import tqdm
+from progress import Progress
+from match_cache import MatchCache
+from address_normalizer import normalize_abbrev, normalize_many
+from excel_cache import read_sheet
 
-tqdm.pandas()
+USE_MATCH_CACHE = True  # reuse results for repeated (cleaned address, postcode) pairs across runs
+SCORE_THRESHOLD = 80
+STRICT_POSTCODE = "53300"  # this postcode needs a higher score to accept a match
+STRICT_THRESHOLD = 85
+CHUNK_ROWS = 2048  # inputs per sparse product, bounds the memory of one score block
+TOP_K = 1  # >1 also lists the runner-up references in a "Top Matches" column
+CANDIDATE_MODE = "all"  # "all", "postcode", "bigram" or "postcode+bigram"
+POSTCODE_RADIUS = 0  # "postcode" also takes references whose postcode is within this distance
+BIGRAM_PROBES = 3  # "bigram" takes references sharing any of the input's rarest bigrams
+USE_REFERENCE_CACHE = True  # reuse the fitted vectorizer and reference matrix while the Reference sheet is unchanged
+REFERENCE_CACHE_DIR = os.path.join(os.path.expanduser("~"), "Desktop", "av_model_reference")
+REFERENCE_CACHE_VERSION = 2  # bump when clean_string, the vectorizer settings or the saved layout change
+CSR_PARTS = ("data", "indices", "indptr")
 
 def clean_string(text):
-    if not isinstance(text, str):
-        return ""
-    cleaned = (
-        text.replace(",", " ").replace(".", " ").replace("_", " ")
-        .replace(";", " ").replace("'", " ").replace("{", " ")
-        .replace("}", " ").replace("[", " ").replace("]", " ")
-        .replace("\\", " ").replace("?", " ").replace("!", " ")
-        .replace("*", " ").replace(":", " ").replace("\n", " ")
-        .lower()
-    )
-    replacements = {
-        "sekolah menengah kebangsaan": "smk", "sekolah menengah": "smk",
-        "sekolah kebangsaan": "sk", "sekolah rendah kebangsaan": "srk",
-        "sekolah rendah": "sk", "sekolah jenis kebangsaan": "sjk",
-        "sekolah agama": "sra", "kolej vokasional": "kv",
-        "kolej komuniti": "kk", "kolej matrikulasi": "km",
-        "universiti teknologi mara": "uitm", "universiti kebangsaan malaysia": "ukm",
-        "universiti teknologi malaysia": "utm", "universiti sains malaysia": "usm",
-        "universiti putra malaysia": "upm", "universiti malaysia sabah": "ums",
-        "universiti malaya": "um", "maktab rendah sains mara": "mrsm",
-        "jalan": "jln", "lorong": "lrg", "kampung": "kg", "taman": "tmn"
-    }
-    for long, abbr in replacements.items():
-        cleaned = re.sub(rf"\b{re.escape(long)}\b", abbr, cleaned)
-
-    match = re.search(r"(.*?)(\d+)$", cleaned)
-    if match:
-        alpha_part = match.group(1)
-        numeric_part = re.sub(r"(\d+)\s+\1", r"\1", match.group(2))
-        cleaned = f"{alpha_part} {numeric_part}"
-
-    words = cleaned.split()
-    seen = set()
-    return " ".join([w for w in words if not (w in seen or seen.add(w))]).strip()
+    return normalize_abbrev(text)
 
-def match_address_to_latlong(filepath):
-    start_time = perf_counter()
-    df_input = pd.read_excel(filepath, sheet_name='Input')
-    df_nodes = pd.read_excel(filepath, sheet_name='Reference')
+def top_k_matches(input_matrix, ref_t, k=1, chunk_rows=CHUNK_ROWS, progress=None):
+    # TfidfVectorizer rows are already L2-normalized, so the sparse product X @ R.T
+    # is the cosine similarity. ref_t is R.T as CSR (bigrams x references).
+    # Scoring a chunk of inputs at a time keeps each score block sparse and
+    # bounded instead of one dense vector per input.
+    n = input_matrix.shape[0]
+    best_idx = np.zeros((n, k), dtype=np.int64)
+    best_score = np.zeros((n, k))
+    for start in range(0, n, chunk_rows):
+        scores = (input_matrix[start:start + chunk_rows] @ ref_t).tocsr()
+        scores.sort_indices()  # ties go to the first reference, like ndarray.argmax
+        rows = np.arange(scores.shape[0])
+        if k == 1:
+            idx = np.asarray(scores.argmax(axis=1)).ravel()
+            best_idx[start + rows, 0] = idx
+            best_score[start + rows, 0] = np.asarray(scores[rows, idx]).ravel()
+        else:
+            for row in rows:
+                lo, hi = scores.indptr[row], scores.indptr[row + 1]
+                top = np.argsort(-scores.data[lo:hi], kind="stable")[:k]
+                best_idx[start + row, :len(top)] = scores.indices[lo:hi][top]
+                best_score[start + row, :len(top)] = scores.data[lo:hi][top]
+        if progress:
+            progress.update(len(rows))
+    return best_idx, best_score
 
-    for col in ["LL", "Matched Key", "Score"]:
-        if col not in df_input.columns:
-            df_input[col] = "" if col != "Score" else 0
+# --- Reference Cache ---
+# Cleaning the Reference sheet and fitting the vectorizer is the same work on
+# every run against an unchanged reference. The fitted vectorizer and node pool
+# are pickled, and the reference matrix and its transpose are kept as raw CSR
+# arrays that load memory-mapped, under a directory named after the source
+# workbook and the reference content hash.
 
-    df_input["LL"] = df_input["LL"].astype("object")
-    df_input["Matched Key"] = df_input["Matched Key"].astype("object")
-    df_input["Score"] = df_input["Score"].astype("float")
-
-    # Preprocess reference list
+def build_reference(df_nodes):
     node_pool = []
     for _, row in df_nodes.iterrows():
         key = str(row.iloc[0] or "")
         ll = row.iloc[2]
         cleaned_key = clean_string(key)
-        node_pool.append({"key": key, "ll": ll, "cleaned_key": cleaned_key})
+        node_pool.append({"key": key, "postcode": row.iloc[1], "ll": ll, "cleaned_key": cleaned_key})
 
     vectorizer = TfidfVectorizer(analyzer='char', ngram_range=(2, 2))
     ref_matrix = vectorizer.fit_transform([n['cleaned_key'] for n in node_pool])
+    return node_pool, vectorizer, ref_matrix
+
+def save_csr(path, prefix, matrix):
+    for name in CSR_PARTS:
+        np.save(os.path.join(path, f"{prefix}{name}.npy"), getattr(matrix, name))
+    np.save(os.path.join(path, f"{prefix}shape.npy"), np.array(matrix.shape))
+
+def load_csr(path, prefix):
+    data, indices, indptr = (np.load(os.path.join(path, f"{prefix}{name}.npy"), mmap_mode="r") for name in CSR_PARTS)
+    shape = tuple(np.load(os.path.join(path, f"{prefix}shape.npy")))
+    return csr_matrix((data, indices, indptr), shape=shape, copy=False)
+
+def load_reference(df_nodes, reference_hash, source, cache_dir=None):
+    # Returns (node_pool, vectorizer, ref_matrix, ref_t); source is the workbook
+    # the Reference sheet came from, so each workbook keeps its own entry
+    if not USE_REFERENCE_CACHE:
+        node_pool, vectorizer, ref_matrix = build_reference(df_nodes)
+        return node_pool, vectorizer, ref_matrix, ref_matrix.T.tocsr()
+    cache_dir = cache_dir or REFERENCE_CACHE_DIR
+    source_key = hashlib.sha1(os.path.abspath(source).encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(cache_dir, f"{source_key}-{reference_hash}-v{REFERENCE_CACHE_VERSION}")
+    if os.path.isdir(path):
+        node_pool, vectorizer = joblib.load(os.path.join(path, "model.joblib"))
+        print(f"♻️ Loaded fitted reference from {path}")
+        return node_pool, vectorizer, load_csr(path, ""), load_csr(path, "t_")
+
+    node_pool, vectorizer, ref_matrix = build_reference(df_nodes)
+    ref_t = ref_matrix.T.tocsr()
+    # Written beside the final directory and renamed, so an interrupted save is never loaded
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    joblib.dump((node_pool, vectorizer), os.path.join(tmp_path, "model.joblib"))
+    save_csr(tmp_path, "", ref_matrix)
+    save_csr(tmp_path, "t_", ref_t)
+    # Only this workbook's earlier references are dropped, other workbooks share the directory
+    for old in os.listdir(cache_dir):
+        if old.startswith(f"{source_key}-") and old != os.path.basename(tmp_path):
+            shutil.rmtree(os.path.join(cache_dir, old), ignore_errors=True)
+    os.replace(tmp_path, path)
+    return node_pool, vectorizer, ref_matrix, ref_t
+
+# --- Candidate Selection ---
+# Instead of scoring every input against the whole reference, each input can be
+# scored against a candidate subset, so cost follows local candidates rather
+# than reference size. Candidate rows stay sorted, so ties still go to the
+# first reference.
+
+def postcode_key(value):
+    # Excel hands back 53300, 53300.0 or "53300 " depending on the column
+    text = str(value).strip()
+    return text[:-2] if text.endswith(".0") else text
+
+def postcode_blocks(ref_postcodes):
+    blocks = {}
+    for row, postcode in enumerate(ref_postcodes):
+        blocks.setdefault(postcode_key(postcode), []).append(row)
+    return {postcode: np.array(rows, dtype=np.int64) for postcode, rows in blocks.items()}
+
+def postcode_candidates(postcode, blocks, radius):
+    postcode = postcode_key(postcode)
+    if radius and postcode.isdigit():
+        # Neighbouring postcodes are numerically close
+        width = len(postcode)
+        nearby = [str(p).zfill(width) for p in range(int(postcode) - radius, int(postcode) + radius + 1)]
+        found = [blocks[p] for p in nearby if p in blocks]
+        return np.unique(np.concatenate(found)) if found else np.array([], dtype=np.int64)
+    return blocks.get(postcode, np.array([], dtype=np.int64))
+
+def bigram_candidates(input_matrix, row, ref_csc, doc_freq, probes):
+    # Rare bigrams are the selective ones, so only the input's rarest few are looked up
+    cols = input_matrix.indices[input_matrix.indptr[row]:input_matrix.indptr[row + 1]]
+    rarest = cols[np.argsort(doc_freq[cols], kind="stable")[:probes]]
+    postings = [ref_csc.indices[ref_csc.indptr[col]:ref_csc.indptr[col + 1]] for col in rarest]
+    return np.unique(np.concatenate(postings)) if postings else np.array([], dtype=np.int64)
+
+def candidate_groups(input_matrix, ref_matrix, postcodes, ref_postcodes, mode, radius, probes):
+    # Yields (input rows, candidate reference rows); inputs sharing a postcode
+    # share one block, bigram candidates are per input
+    by_postcode = {}
+    for row, postcode in enumerate(postcodes):
+        by_postcode.setdefault(postcode_key(postcode), []).append(row)
+    blocks = postcode_blocks(ref_postcodes) if "postcode" in mode else None
+
+    if "bigram" not in mode:
+        for postcode, rows in by_postcode.items():
+            yield np.array(rows), postcode_candidates(postcode, blocks, radius)
+        return
+
+    ref_csc = ref_matrix.tocsc()
+    doc_freq = np.diff(ref_csc.indptr)
+    input_matrix = input_matrix.tocsr()
+    for postcode, rows in by_postcode.items():
+        block = postcode_candidates(postcode, blocks, radius) if blocks is not None else None
+        for row in rows:
+            cands = bigram_candidates(input_matrix, row, ref_csc, doc_freq, probes)
+            if block is not None:
+                cands = np.intersect1d(cands, block, assume_unique=True)
+            yield np.array([row]), cands
+
+def top_k_in_candidates(input_matrix, ref_matrix, groups, k=1, progress=None):
+    n = input_matrix.shape[0]
+    best_idx = np.zeros((n, k), dtype=np.int64)
+    best_score = np.zeros((n, k))  # inputs without candidates keep score 0 and never match
+    for rows, cands in groups:
+        if len(cands):
+            idx, score = top_k_matches(input_matrix[rows], ref_matrix[cands].T.tocsr(), k)
+            best_idx[rows] = cands[idx]
+            best_score[rows] = score
+        if progress:
+            progress.update(len(rows))
+    return best_idx, best_score
+
+def reference_hash_of(df_nodes):
+    return f"{pd.util.hash_pandas_object(df_nodes.astype(str), index=False).sum():016x}"
+
+def open_match_cache(reference_hash):
+    if not USE_MATCH_CACHE:
+        return None
+    return MatchCache("av_model", {
+        "reference": reference_hash,
+        "thresholds": (SCORE_THRESHOLD, STRICT_POSTCODE, STRICT_THRESHOLD),
+        "top_k": TOP_K,
+        "candidates": (CANDIDATE_MODE, POSTCODE_RADIUS, BIGRAM_PROBES),
+    })
+
+def match_keys(keys, node_pool, vectorizer, ref_matrix, ref_t, cache=None):
+    # Returns {(cleaned address, postcode): (LL, key, score[, top matches])}
+    known = cache.get_many(set(keys)) if cache else {}
+    todo = list(dict.fromkeys(key for key in keys if key not in known))
+
+    fresh = {}
+    progress = Progress(len(todo), desc="🔍 Matching")
+    if todo:
+        input_matrix = vectorizer.transform([cleaned_address for cleaned_address, _ in todo])
+        postcodes = np.array([postcode for _, postcode in todo], dtype=object)
+        if CANDIDATE_MODE == "all":
+            best_idx, best_score = top_k_matches(input_matrix, ref_t, TOP_K, progress=progress)
+        else:
+            groups = candidate_groups(
+                input_matrix, ref_matrix, postcodes, [n["postcode"] for n in node_pool],
+                CANDIDATE_MODE, POSTCODE_RADIUS, BIGRAM_PROBES,
+            )
+            best_idx, best_score = top_k_in_candidates(input_matrix, ref_matrix, groups, TOP_K, progress)
+
+        # Threshold rules on whole columns instead of per row
+        final_scores = np.rint(best_score * 100).astype(int)
+        accepted = (final_scores[:, 0] >= SCORE_THRESHOLD) & ~(
+            (postcodes == STRICT_POSTCODE) & (final_scores[:, 0] < STRICT_THRESHOLD)
+        )
+
+        for i, key in enumerate(todo):
+            result = ("", "", 0)
+            if accepted[i]:
+                best_node = node_pool[best_idx[i, 0]]
+                result = (best_node["ll"], best_node["key"], int(final_scores[i, 0]))
+            if TOP_K > 1:
+                result += ("; ".join(
+                    f"{node_pool[j]['key']} ({score})"
+                    for j, score in zip(best_idx[i], final_scores[i]) if score > 0
+                ),)
+            fresh[key] = result
+    progress.close()
+
+    if cache:
+        cache.put_many(fresh)
+        print(f"♻️ Reused {cache.hits} cached results, matched {len(fresh)} new addresses")
+    known.update(fresh)
+    return known
+
+def match_address_to_latlong(filepath):
+    start_time = perf_counter()
+    df_input = read_sheet(filepath, sheet_name='Input')
+    df_nodes = read_sheet(filepath, sheet_name='Reference', usecols=[0, 1, 2])
+
+    for col in ["LL", "Matched Key", "Score"]:
+        if col not in df_input.columns:
+            df_input[col] = "" if col != "Score" else 0
+
+    reference_hash = reference_hash_of(df_nodes)
+    node_pool, vectorizer, ref_matrix, ref_t = load_reference(df_nodes, reference_hash, filepath)
+    cache = open_match_cache(reference_hash)
+
+    keys = list(zip(normalize_many(df_input["full_address"].astype(str), "abbrev"), df_input["postcode"].astype(str)))
+    known = match_keys(keys, node_pool, vectorizer, ref_matrix, ref_t, cache)
 
-    # Modern progress bar using tqdm
-    for idx in tqdm(range(len(df_input)), desc="🔍 Matching", unit="row"):
-        row = df_input.iloc[idx]
-        raw_address = str(row.get("full_address", ""))
-        postcode = str(row.get("postcode", ""))
-        cleaned_address = clean_string(raw_address)
-
-        input_vec = vectorizer.transform([cleaned_address])
-        sim_scores = cosine_similarity(input_vec, ref_matrix).flatten()
-
-        best_idx = sim_scores.argmax()
-        best_score = sim_scores[best_idx]
-        final_score = round(best_score * 100)
-
-        if final_score >= 80:
-            if postcode == "53300" and final_score < 85:
-                pass
-            else:
-                best_node = node_pool[best_idx]
-                df_input.at[idx, "LL"] = best_node["ll"]
-                df_input.at[idx, "Matched Key"] = best_node["key"]
-                df_input.at[idx, "Score"] = final_score
-                continue
-
-        df_input.at[idx, "LL"] = ""
-        df_input.at[idx, "Matched Key"] = ""
-        df_input.at[idx, "Score"] = 0
+    columns = ["LL", "Matched Key", "Score"] + (["Top Matches"] if TOP_K > 1 else [])
+    results = pd.DataFrame([known[key] for key in keys], index=df_input.index, columns=columns)
+    df_input["LL"] = results["LL"].astype("object")
+    df_input["Matched Key"] = results["Matched Key"].astype("object")
+    df_input["Score"] = results["Score"].astype("float")
+    if TOP_K > 1:
+        df_input["Top Matches"] = results["Top Matches"]
 
     df_input.to_csv("C:/Users/User/Desktop/model_match.csv", index=False)
     total_time = round(perf_counter() - start_time, 2)
@@ -102,4 +273,5 @@ def match_address_to_latlong(filepath):
     print(f"⏱️ Total runtime: {timedelta(seconds=int(total_time))}")
 
 # 🔽 Run it
-match_address_to_latlong("C:/Users/User/Desktop/av_model.xlsx")
+if __name__ == "__main__":
+    match_address_to_latlong("C:/Users/User/Desktop/av_model.xlsx")
@@ -0,0 +1,162 @@
+import random
+import re
+from time import perf_counter
+import pandas as pd
+from address_normalizer import PROFILES, normalize_many
+
+# --- Legacy Implementations ---
+# Verbatim copies of the per-script clean_string functions the profiles replace
+
+def legacy_basic(s):  # debug_tier2_test, Tera_match_generator, test_2.clean_string
+    s = str(s).lower()
+    s = re.sub(r"[^\w\s/]", " ", s)
+    s = re.sub(r"\s+", " ", s)
+    return s.strip()
+
+def legacy_alnum(text):  # test_2.clean_address
+    if not isinstance(text, str):
+        return ""
+    text = text.lower()
+    text = re.sub(r"[^a-z0-9\s/]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text
+
+def remove_repetitive_words(s):
+    words = s.lower().split()
+    seen = set()
+    return " ".join([w for w in words if not (w in seen or seen.add(w))])
+
+def remove_repetitive_numbers(s):
+    return re.sub(r"(\d+)\s+\1", r"\1", s)
+
+def legacy_tier1(text):  # test_1
+    if not isinstance(text, str):
+        return ""
+    cleaned = (
+        text.replace(",", " ").replace(".", " ").replace("_", " ")
+        .replace(";", " ").replace("'", " ").replace("{", " ")
+        .replace("}", " ").replace("[", " ").replace("]", " ")
+        .replace("\\", " ").replace("?", " ").replace("!", " ")
+        .replace("*", " ").replace(":", " ").replace("\n", " ")
+        .replace("taman", "tmn").replace("lorong", "lrg")
+        .replace("kampung", "kg").replace("jalan", "jln")
+    )
+    return remove_repetitive_words(cleaned.lower().strip())
+
+def legacy_abbrev(text):  # zus, av_model
+    if not isinstance(text, str):
+        return ""
+    cleaned = (
+        text.replace(",", " ").replace(".", " ").replace("_", " ")
+            .replace(";", " ").replace("'", " ").replace("{", " ")
+            .replace("}", " ").replace("[", " ").replace("]", " ")
+            .replace("\\", " ").replace("?", " ").replace("!", " ")
+            .replace("*", " ").replace(":", " ").replace("\n", " ")
+            .lower()
+    )
+    replacements = {
+        "sekolah menengah kebangsaan": "smk",
+        "sekolah menengah": "smk",
+        "sekolah kebangsaan": "sk",
+        "sekolah rendah kebangsaan": "srk",
+        "sekolah rendah": "sk",
+        "sekolah jenis kebangsaan": "sjk",
+        "sekolah agama": "sra",
+        "kolej vokasional": "kv",
+        "kolej komuniti": "kk",
+        "kolej matrikulasi": "km",
+        "universiti teknologi mara": "uitm",
+        "universiti kebangsaan malaysia": "ukm",
+        "universiti teknologi malaysia": "utm",
+        "universiti sains malaysia": "usm",
+        "universiti putra malaysia": "upm",
+        "universiti malaysia sabah": "ums",
+        "universiti malaya": "um",
+        "maktab rendah sains mara": "mrsm",
+        "jalan": "jln",
+        "lorong": "lrg",
+        "kampung": "kg",
+        "taman": "tmn"
+    }
+    for long, abbr in replacements.items():
+        cleaned = re.sub(rf"\b{re.escape(long)}\b", abbr, cleaned)
+    match = re.search(r"(.*?)(\d+)$", cleaned)
+    if match:
+        alpha_part = match.group(1)
+        numeric_part = remove_repetitive_numbers(match.group(2))
+        cleaned = f"{alpha_part} {numeric_part}"
+    cleaned = remove_repetitive_words(cleaned)
+    return cleaned.strip()
+
+LEGACY = {
+    "basic": legacy_basic,
+    "alnum": legacy_alnum,
+    "tier1": legacy_tier1,
+    "abbrev": legacy_abbrev,
+}
+
+# --- Sample Addresses ---
+
+WORDS = [
+    "No", "12", "12A", "Jalan", "jalan", "JALAN", "Lorong", "lorong", "Taman", "taman", "tamanjaya",
+    "Kampung", "kampung", "Sekolah", "sekolah", "menengah", "kebangsaan", "rendah", "jenis", "agama",
+    "kolej", "komuniti", "universiti", "teknologi", "mara", "malaya", "malaysia", "sains", "putra",
+    "maktab", "Blok", "A-3-1", "Pangsapuri", "Seri", "Melati", "Kuala", "Lumpur", "Selangor",
+    "Bandar", "Baru", "Bangi", "Cheras", "Ampang", "53300", "43000", "Wilayah", "Persekutuan",
+    "Résidence", "Café", "İstana", "Ｆ１", "s/o", "Lot", "PT", "1234",
+]
+JOINERS = [" ", " ", " ", ", ", ",", ". ", "  ", "\t", "\n", " / ", "-", "_", ";", "'", " (", ") ", "[", "]", "!", "?", ":", "*", "\\", "&", "#"]
+
+def sample_addresses(n, seed=0):
+    rng = random.Random(seed)
+    addresses = []
+    for _ in range(n):
+        parts = []
+        for _ in range(rng.randint(1, 12)):
+            parts.append(rng.choice(WORDS))
+            parts.append(rng.choice(JOINERS))
+        if rng.random() < 0.5:
+            parts.append(rng.choice(["53300", "43000 43000", "12", "a12", "blok 3 3"]))
+        addresses.append("".join(parts))
+    # Realistic inputs repeat: the same building shows up many times
+    return [rng.choice(addresses) if rng.random() < 0.6 else a for a in addresses]
+
+EDGE_CASES = [
+    "", " ", None, float("nan"), 53300, 12.5, "sekolah menengah kebangsaanx", "sekolah rendah kebangsaan",
+    "SEKOLAH MENENGAH KEBANGSAAN SERI", "jalanjalan", "Taman taman tmn", "blok 3 3", "12 12", "unit12",
+    "universiti malaya malaysia", "kampunglorong", "a\r\nb\x1fc", "jln.  jln,jln",
+]
+
+# --- Benchmark ---
+
+def best_of(func, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        times.append(perf_counter() - start)
+    return min(times)
+
+def run(n=200_000):
+    addresses = sample_addresses(n) + EDGE_CASES
+    column = pd.Series(addresses, dtype=object)
+    strings = pd.Series([a for a in addresses if isinstance(a, str)], dtype=object)
+    print(f"{len(addresses):,} addresses, {column.nunique():,} distinct\n")
+    print(f"{'profile':<8} {'legacy':>9} {'scalar':>9} {'batch':>9}   speedup (scalar / batch)")
+    for name, legacy in LEGACY.items():
+        new = PROFILES[name]
+        expected = [legacy(a) for a in addresses]
+        assert [new(a) for a in addresses] == expected, f"{name}: scalar output differs from legacy"
+        assert normalize_many(column, name).tolist() == expected, f"{name}: batch output differs from legacy"
+        assert normalize_many(strings, name).tolist() == [legacy(a) for a in strings], f"{name}: batch output differs"
+
+        t_legacy = best_of(lambda: [legacy(a) for a in addresses])
+        t_scalar = best_of(lambda: [new(a) for a in addresses])
+        t_batch = best_of(lambda: normalize_many(strings, name))
+        print(
+            f"{name:<8} {t_legacy:>8.3f}s {t_scalar:>8.3f}s {t_batch:>8.3f}s"
+            f"   {t_legacy / t_scalar:.1f}x / {t_legacy / t_batch:.1f}x"
+        )
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,65 @@
+import sqlite3
+import time
+
+from debug_tier2_test import DB_PATH, RECENT_MONTHS, clean_string, get_lsh, lsh_index_params
+from lsh_index import BUCKET_TABLE, create_tables
+
+# --- Configuration ---
+TABLE = "data_2025"
+BATCH_SIZE = 50000
+
+# --- Index Build ---
+
+def build_lsh_index(db_path=DB_PATH, months=RECENT_MONTHS, batch_size=BATCH_SIZE):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+    # Signatures over the same token sets tier-2 scores (clean_string(split)),
+    # so a bucket hit means the scorer sees the Jaccard the index estimated
+    lsh = get_lsh()
+    params = lsh_index_params()
+    create_tables(conn, params)
+    precleaned = "tokens" in {row[1] for row in conn.execute(f"PRAGMA table_info({TABLE})")}
+
+    month_marks = ",".join("?" for _ in months)
+    start_time = time.time()
+    last_rowid = 0
+    done = 0
+    while True:
+        rows = conn.execute(f"""
+            SELECT rowid, {"tokens" if precleaned else "split"} FROM {TABLE}
+            WHERE rowid > ? AND data_date IN ({month_marks})
+            ORDER BY rowid
+            LIMIT ?
+        """, (last_rowid, *months, batch_size)).fetchall()
+        if not rows:
+            break
+
+        postings = []
+        for rowid, text in rows:
+            tokens = set((text or "").split()) if precleaned else set(clean_string(text).split())
+            if len(tokens) < params["min_tokens"]:
+                continue  # can never reach OVERLAP_THRESHOLD shared tokens
+            postings.extend((band, bucket, rowid) for band, bucket in lsh.buckets(tokens))
+        conn.executemany(f"INSERT INTO {BUCKET_TABLE} VALUES (?, ?, ?)", postings)
+        conn.commit()
+
+        last_rowid = rows[-1][0]
+        done += len(rows)
+        print(f"\r#️⃣ Hashed {done:,} rows | {int(time.time() - start_time)}s", end="", flush=True)
+
+    # Built after the bulk load so SQLite can sort once instead of per insert
+    print("\n🔧 Creating bucket index...")
+    conn.execute(f"CREATE INDEX idx_{BUCKET_TABLE} ON {BUCKET_TABLE}(band, bucket, doc_id)")
+    conn.commit()
+    conn.close()
+    print(f"✅ {BUCKET_TABLE} ready for months {', '.join(months)} ({lsh.bands} bands x {lsh.rows} rows)")
+
+
+if __name__ == "__main__":
+    build_lsh_index()
+
+#one time run, rebuild after new months are loaded or the thresholds change
+#set USE_LSH_RECOVERY = True in debug_tier2_test.py afterwards
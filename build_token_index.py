@@ -0,0 +1,64 @@
+import sqlite3
+import time
+
+from debug_tier2_test import DB_PATH, RECENT_MONTHS
+
+# --- Configuration ---
+TABLE = "data_2025"
+INDEX_TABLE = "token_index"
+BATCH_SIZE = 50000
+
+# --- Index Build ---
+
+def build_token_index(db_path=DB_PATH, months=RECENT_MONTHS, batch_size=BATCH_SIZE):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+    # One posting per distinct (postcode, token, row). Built from the tokens
+    # column written by precompute_tokens.py so the index sees exactly the
+    # token sets tier-2 scores against.
+    conn.execute(f"DROP TABLE IF EXISTS {INDEX_TABLE}")
+    conn.execute(f"CREATE TABLE {INDEX_TABLE} (postcode TEXT, token TEXT, doc_id INTEGER)")
+
+    month_marks = ",".join("?" for _ in months)
+    start_time = time.time()
+    last_rowid = 0
+    done = 0
+    while True:
+        rows = conn.execute(f"""
+            SELECT rowid, postcode, tokens FROM {TABLE}
+            WHERE rowid > ? AND data_date IN ({month_marks})
+            ORDER BY rowid
+            LIMIT ?
+        """, (last_rowid, *months, batch_size)).fetchall()
+        if not rows:
+            break
+
+        postings = [
+            (postcode, token, rowid)
+            for rowid, postcode, tokens in rows
+            for token in (tokens or "").split()
+        ]
+        conn.executemany(f"INSERT INTO {INDEX_TABLE} VALUES (?, ?, ?)", postings)
+        conn.commit()
+
+        last_rowid = rows[-1][0]
+        done += len(rows)
+        print(f"\r🗂️ Indexed {done:,} rows | {int(time.time() - start_time)}s", end="", flush=True)
+
+    # Built after the bulk load so SQLite can sort once instead of per insert
+    print("\n🔧 Creating covering index...")
+    conn.execute(f"CREATE INDEX idx_{INDEX_TABLE} ON {INDEX_TABLE}(postcode, token, doc_id)")
+    conn.commit()
+    conn.close()
+    print(f"✅ {INDEX_TABLE} ready for months {', '.join(months)}")
+
+
+if __name__ == "__main__":
+    build_token_index()
+
+#run precompute_tokens.py first, the postings come from the tokens column
+#rebuild whenever RECENT_MONTHS changes
+#set CANDIDATE_SOURCE = "token_index" in debug_tier2_test.py afterwards
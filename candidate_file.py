@@ -0,0 +1,80 @@
+import json
+import mmap
+import struct
+
+# --- Layout ---
+# [MAGIC][index offset u64][index length u64][segment][segment]...[json index]
+# One contiguous segment per postcode, already in recency order. Records are
+# separated by RECORD_SEP and fields by FIELD_SEP, both stripped from values on
+# export, so a segment decodes with two str.split calls.
+MAGIC = b"SHCAND01"
+HEADER = struct.Struct("<8sQQ")
+RECORD_SEP = "\x1e"
+FIELD_SEP = "\x1f"
+COLUMNS = ("split", "postcode", "LL", "cleaned", "tokens", "eff_tokens", "is_building")
+
+def _field(value):
+    return "" if value is None else str(value).replace(RECORD_SEP, " ").replace(FIELD_SEP, " ")
+
+# --- Writer ---
+
+class CandidateFileWriter:
+    def __init__(self, path, months):
+        self.path = path
+        self.months = list(months)
+        self.segments = {}
+        self.f = open(path, "wb")
+        self.f.write(HEADER.pack(MAGIC, 0, 0))
+
+    def add_segment(self, postcode, rows):
+        if not rows:
+            return
+        payload = RECORD_SEP.join(FIELD_SEP.join(_field(v) for v in row) for row in rows).encode("utf-8")
+        self.segments[str(postcode)] = [self.f.tell(), len(payload), len(rows)]
+        self.f.write(payload)
+
+    def close(self):
+        index = json.dumps({
+            "columns": list(COLUMNS),
+            "months": self.months,
+            "postcodes": self.segments,
+        }).encode("utf-8")
+        index_offset = self.f.tell()
+        self.f.write(index)
+        self.f.seek(0)
+        self.f.write(HEADER.pack(MAGIC, index_offset, len(index)))
+        self.f.close()
+
+# --- Reader ---
+
+class CandidateFile:
+    def __init__(self, path):
+        self.f = open(path, "rb")
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_offset, index_length = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a candidate file")
+        index = json.loads(self.mm[index_offset:index_offset + index_length])
+        if tuple(index["columns"]) != COLUMNS:
+            raise ValueError(f"{path} has columns {index['columns']}, rerun export_candidates.py")
+        self.months = tuple(index["months"])
+        self.segments = index["postcodes"]
+
+    def count(self, postcode):
+        segment = self.segments.get(postcode)
+        return segment[2] if segment else 0
+
+    def fetch(self, postcode, limit=None):
+        segment = self.segments.get(postcode)
+        if not segment:
+            return []
+        offset, length, _ = segment
+        text = self.mm[offset:offset + length].decode("utf-8")
+        records = text.split(RECORD_SEP, limit) if limit else text.split(RECORD_SEP)
+        if limit:
+            records = records[:limit]
+        return [tuple(record.split(FIELD_SEP)) for record in records]
+
+    def close(self):
+        self.mm.close()
+        self.f.close()
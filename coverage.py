@@ -2,22 +2,15 @@ import pandas as pd
 import re
 from time import perf_counter
 import spacy
+from keyword_matcher import KeywordClassifier
 
-start_time = perf_counter()
-
-# --- Load input CSV ---
-csv_path = r"C:\Users\User\Desktop\For kimi.csv"
-try:
-    df = pd.read_csv(csv_path, encoding='utf-8')
-except UnicodeDecodeError:
-    df = pd.read_csv(csv_path, encoding='windows-1252')
-
-# --- Clean non-breaking spaces ---
-df.columns = df.columns.str.replace('\xa0', ' ', regex=True)
-df = df.astype(str).apply(lambda col: col.str.replace('\xa0', ' ', regex=True))
-
-# --- Load spaCy NER model ---
-nlp = spacy.load("en_core_web_sm")
+# --- Configuration ---
+CSV_PATH = r"C:\Users\User\Desktop\For kimi.csv"
+OUTPUT_PATH = r"C:\Users\User\Desktop\For kimi - FAST OUTPUT.csv"
+BATCH_SIZE = 256  # texts per nlp.pipe batch
+N_PROCESS = 1  # >1 runs NER in that many worker processes
+NAME_LABELS = ("ORG", "FAC", "GPE", "LOC")
+CLASSIFY_WHOLE_WORDS = False  # False keeps the substring tests, so "sk" still matches inside "kiosk"
 
 # --- Category rules (extended) ---
 classification_rules = {
@@ -38,38 +31,63 @@ classification_rules = {
 }
 
 # --- Extract name, type, postcode ---
-def extract_name_and_type(text):
-    text = str(text).lower()
-    doc = nlp(text)
+postcode_re = re.compile(r"\b\d{5}\b")
+
+def load_nlp():
+    # Only entities are read. en_core_web_sm's ner carries its own tok2vec, so
+    # the tagger, parser, lemmatizer and shared tok2vec can all be switched off.
+    return spacy.load("en_core_web_sm", enable=["ner"])
+
+# One automaton over every category's keywords; the first category in dict order wins
+type_classifier = KeywordClassifier(classification_rules, word_boundary=CLASSIFY_WHOLE_WORDS)
+
+def classify_type(text):
+    return type_classifier.classify(text)
+
+def extract_postcode(text):
+    postcode_match = postcode_re.search(text)
+    return postcode_match.group() if postcode_match else ""
+
+def extract_name_and_type(nlp, addresses, batch_size=BATCH_SIZE, n_process=N_PROCESS):
+    # Returns (names, types, postcodes) aligned with addresses. Duplicate
+    # addresses go through NER once; nlp.pipe batches the distinct ones.
+    texts = [str(text).lower() for text in addresses]
+    unique = list(dict.fromkeys(texts))
+    extracted = {}
+    for text, doc in zip(unique, nlp.pipe(unique, batch_size=batch_size, n_process=n_process)):
+        name_parts = [ent.text for ent in doc.ents if ent.label_ in NAME_LABELS]
+        name = name_parts[0] if name_parts else ""
+        extracted[text] = (name.strip().title(), classify_type(text), extract_postcode(text))
+    names, types, postcodes = zip(*(extracted[text] for text in texts)) if texts else ((), (), ())
+    return list(names), list(types), list(postcodes)
 
-    # Extract name using spaCy
-    name_parts = [ent.text for ent in doc.ents if ent.label_ in ("ORG", "FAC", "GPE", "LOC")]
-    name = name_parts[0] if name_parts else ""
+# Worker processes (N_PROCESS > 1, spawn on Windows) re-import this file, so the run itself stays behind the guard
+if __name__ == "__main__":
+    start_time = perf_counter()
 
-    # Classify type
-    classified_type = "Unknown"
-    for label, keywords in classification_rules.items():
-        if any(kw in text for kw in keywords):
-            classified_type = label
-            break
+    # --- Load input CSV ---
+    try:
+        df = pd.read_csv(CSV_PATH, encoding='utf-8')
+    except UnicodeDecodeError:
+        df = pd.read_csv(CSV_PATH, encoding='windows-1252')
 
-    # Extract postcode
-    postcode_match = re.search(r"\b\d{5}\b", text)
-    postcode = postcode_match.group() if postcode_match else ""
+    # --- Clean non-breaking spaces ---
+    df.columns = df.columns.str.replace('\xa0', ' ', regex=True)
+    df = df.astype(str).apply(lambda col: col.str.replace('\xa0', ' ', regex=True))
 
-    return pd.Series([name.strip().title(), classified_type, postcode])
+    # --- Load spaCy NER model ---
+    nlp = load_nlp()
 
-# --- Apply extraction ---
-df[['Name', 'Validation', 'Postcode Extracted']] = df['Address'].apply(extract_name_and_type)
+    # --- Apply extraction ---
+    df['Name'], df['Validation'], df['Postcode Extracted'] = extract_name_and_type(nlp, df['Address'])
 
-# --- Export CSV ---
-output_path = r"C:\Users\User\Desktop\For kimi - FAST OUTPUT.csv"
-df.to_csv(output_path, index=False)
+    # --- Export CSV ---
+    df.to_csv(OUTPUT_PATH, index=False)
 
-# --- Summary ---
-total_time = perf_counter() - start_time
-match_count = df["Name"].astype(bool).sum()
+    # --- Summary ---
+    total_time = perf_counter() - start_time
+    match_count = df["Name"].astype(bool).sum()
 
-print(f"\n✅ Extraction complete. File saved to: {output_path}")
-print(f"⏱️ Total runtime: {int(total_time // 60)} minutes {round(total_time % 60, 1)} seconds")
-print(f"📌 Total matched name rows: {match_count} / {len(df)}")
+    print(f"\n✅ Extraction complete. File saved to: {OUTPUT_PATH}")
+    print(f"⏱️ Total runtime: {int(total_time // 60)} minutes {round(total_time % 60, 1)} seconds")
+    print(f"📌 Total matched name rows: {match_count} / {len(df)}")
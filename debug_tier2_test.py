@@ -1,20 +1,44 @@
 import pandas as pd
+import numpy as np
 import sqlite3
 import re
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
+from scipy.sparse import csr_matrix
 import time
-import sys
 import os
-from multiprocessing import Pool, Manager
-from functools import partial
-from threading import Thread, Event
+import json
+from openpyxl import load_workbook
+from pathlib import Path
+from multiprocessing import Pool
+from candidate_file import CandidateFile
+from parquet_candidates import ParquetCandidates
+from match_cache import MatchCache, file_version
+from lsh_index import MinHashBands, check_params, query_doc_ids
+from keyword_matcher import compile_keyword_tokens, has_keyword_token
+from address_normalizer import normalize_basic, normalize_many
+from excel_cache import read_sheet
+from progress import SharedProgress, init_worker, worker_update, worker_flush
 
 # --- Configuration ---
 DEBUG = False
 DB_PATH = "C:/Users/User/Desktop/Core_2025.sqlite"
 RECENT_MONTHS = ('202507','202506','202505','202504',)
 NUM_WORKERS = 4
-stop_event = Event()
+CDIST_WORKERS = max(1, (os.cpu_count() or NUM_WORKERS) // NUM_WORKERS)  # threads per worker for cdist
+BATCHES_PER_WORKER = 8  # postcode batches queued per worker, more = finer balancing
+CANDIDATE_LIMIT = 12000
+SCORE_BLOCK_ROWS = 256  # inputs per score_block pass, dense matrices are this many rows x candidates
+SQLITE_MMAP_SIZE = 1 << 30  # bytes of the DB each worker may map read-only
+SQLITE_CACHE_KB = 65536
+USE_MATCH_CACHE = True  # reuse results for repeated (cleaned address, postcode) pairs across runs
+STREAMING = False  # chunked read/append with checkpoint + resume, for long runs
+STREAM_CHUNK_ROWS = 20000
+USE_PRECLEANED = False  # read cleaned/tokens/eff_tokens/is_building written by precompute_tokens.py
+CANDIDATE_SOURCE = "postcode"  # "postcode", "token_index" (build_token_index.py), "mmap" (export_candidates.py) or "parquet" (convert)
+CANDIDATE_FILE = "C:/Users/User/Desktop/Core_2025.cand"
+PARQUET_PATH = "C:/Users/User/Desktop/Core_2025_dataset"
+USE_LSH_RECOVERY = False  # unmatched rows retry against near-duplicates from any postcode (build_lsh_index.py)
+LSH_CANDIDATE_LIMIT = 200
 
 # --- Thresholds ---
 OVERLAP_THRESHOLD = 6 # ori used 5
@@ -46,193 +70,523 @@ common_tokens = {
 # --- Utility Functions ---
 
 def clean_string(s):
-    s = str(s).lower()
-    s = re.sub(r"[^\w\s/]", " ", s)
-    s = re.sub(r"\s+", " ", s)
-    return s.strip()
+    return normalize_basic(s)
+
+BUILDING_TOKENS = compile_keyword_tokens(building_keywords)
 
 def has_building_keyword(text):
-    text_tokens = set(text.lower().split())
-    return any(set(kw.lower().split()) & text_tokens for kw in building_keywords)
+    return has_keyword_token(text, BUILDING_TOKENS)
 
 def remove_duplicate_postcode(text):
     return re.sub(r'(\b\d{5}\b)(\s+\1)+', r'\1', text)
 
-def fetch_candidates(postcode, limit=12000): # tuning this affecting result - Ori used 10k
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA journal_mode=OFF")
-    conn.execute("PRAGMA synchronous=OFF")
-    conn.execute("PRAGMA temp_store=MEMORY")
-    cursor = conn.cursor()
-    results = []
-    total = 0
-    for month in RECENT_MONTHS:
-        cursor.execute("""
-            SELECT split, postcode, LL FROM data_2025
-            WHERE postcode = ? AND data_date = ?
-            LIMIT ?
-        """, (postcode, month, limit - total))
-        rows = cursor.fetchall()
-        results.extend(rows)
-        total += len(rows)
-        if total >= limit:
-            break
-    conn.close()
-    return results
-
-def print_progress(shared_counter, total, start_time):
-    while not stop_event.is_set():
-        current = shared_counter.value
-        bar_len = 40
-        filled_len = int(round(bar_len * current / float(total)))
-        bar = '█' * filled_len + '-' * (bar_len - filled_len)
-        percent = round(100.0 * current / float(total), 1)
-        elapsed = time.time() - start_time
-        mins = int(elapsed // 60)
-        secs = int(elapsed % 60)
-        sys.stdout.write(f"\r⏱️ [{bar}] {current}/{total} | {percent}% | {mins}:{secs:02d}")
-        sys.stdout.flush()
-        if current >= total:
-            break
-        time.sleep(0.5)
+def candidate_columns(alias=""):
+    columns = ["split", "postcode", "LL"]
+    if USE_PRECLEANED:
+        columns += ["cleaned", "tokens", "eff_tokens", "is_building"]
+    return ", ".join(alias + c for c in columns)
+
+_conn = None
+_conn_pid = None
+
+def get_connection():
+    # One read-only connection per process, reused for every postcode. Keyed by pid
+    # so a forked worker never inherits the parent's handle.
+    global _conn, _conn_pid
+    if _conn is None or _conn_pid != os.getpid():
+        _conn = sqlite3.connect(Path(DB_PATH).resolve().as_uri() + "?mode=ro", uri=True)
+        _conn.execute("PRAGMA query_only=ON")
+        _conn.execute("PRAGMA temp_store=MEMORY")
+        _conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        _conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+        _conn_pid = os.getpid()
+    return _conn
+
+def recency_order(column="data_date"):
+    # Newest month first, matches the order RECENT_MONTHS is listed in
+    whens = " ".join(f"WHEN ? THEN {rank}" for rank in range(len(RECENT_MONTHS)))
+    return f"CASE {column} {whens} END"
+
+def fetch_candidates(postcode, limit=CANDIDATE_LIMIT): # tuning this affecting result - Ori used 10k
+    # Single pass over idx_data_2025_postcode_date instead of one query per month
+    month_marks = ",".join("?" for _ in RECENT_MONTHS)
+    return get_connection().execute(f"""
+        SELECT {candidate_columns()} FROM data_2025
+        WHERE postcode = ? AND data_date IN ({month_marks})
+        ORDER BY {recency_order()}, rowid
+        LIMIT ?
+    """, (postcode, *RECENT_MONTHS, *RECENT_MONTHS, limit)).fetchall()
+
+def fetch_candidates_by_tokens(postcode, tokens, min_overlap=OVERLAP_THRESHOLD):
+    # Only rows sharing at least min_overlap tokens leave SQLite, so no LIMIT is needed
+    if len(tokens) < min_overlap:
+        return []
+    tokens = sorted(tokens)
+    token_marks = ",".join("?" for _ in tokens)
+    month_marks = ",".join("?" for _ in RECENT_MONTHS)
+    return get_connection().execute(f"""
+        SELECT {candidate_columns("d.")} FROM (
+            SELECT doc_id, COUNT(*) AS hits FROM token_index
+            WHERE postcode = ? AND token IN ({token_marks})
+            GROUP BY doc_id
+            HAVING hits >= ?
+        ) m
+        JOIN data_2025 d ON d.rowid = m.doc_id
+        WHERE d.data_date IN ({month_marks})
+        ORDER BY m.hits DESC, {recency_order("d.data_date")}, d.rowid
+    """, (postcode, *tokens, min_overlap, *RECENT_MONTHS, *RECENT_MONTHS)).fetchall()
+
+_candidate_file = None
+
+def open_candidate_file():
+    # One read-only mapping per worker; the pages themselves live in the shared OS cache
+    global _candidate_file
+    if _candidate_file is None:
+        _candidate_file = CandidateFile(CANDIDATE_FILE)
+        if _candidate_file.months != tuple(RECENT_MONTHS):
+            raise ValueError(f"{CANDIDATE_FILE} was exported for {_candidate_file.months}, rerun export_candidates.py")
+    return _candidate_file
+
+_parquet_candidates = None
+_parquet_pid = None
+
+def open_parquet_candidates():
+    # Per process like get_connection, Arrow state must not cross a fork
+    global _parquet_candidates, _parquet_pid
+    if _parquet_candidates is None or _parquet_pid != os.getpid():
+        _parquet_candidates = ParquetCandidates(PARQUET_PATH, months=RECENT_MONTHS)
+        _parquet_pid = os.getpid()
+    return _parquet_candidates
+
+def fetch_candidates_by_id(doc_ids):
+    # Rows come back in the order of doc_ids
+    id_marks = ",".join("?" for _ in doc_ids)
+    rows = get_connection().execute(f"""
+        SELECT rowid, {candidate_columns()} FROM data_2025 WHERE rowid IN ({id_marks})
+    """, doc_ids).fetchall()
+    by_id = {row[0]: row[1:] for row in rows}
+    return [by_id[doc_id] for doc_id in doc_ids if doc_id in by_id]
+
+_lsh = None
+
+def lsh_index_params():
+    return dict(get_lsh().params(), months=list(RECENT_MONTHS), min_tokens=OVERLAP_THRESHOLD)
+
+def get_lsh():
+    # Permutations are drawn once per process, the band split is tuned to JACCARD_THRESHOLD
+    global _lsh
+    if _lsh is None:
+        _lsh = MinHashBands(JACCARD_THRESHOLD)
+    return _lsh
+
+_lsh_checked_pid = None
+
+def fetch_candidates_by_lsh(tokens):
+    global _lsh_checked_pid
+    if _lsh_checked_pid != os.getpid():
+        check_params(get_connection(), lsh_index_params())
+        _lsh_checked_pid = os.getpid()
+    doc_ids = query_doc_ids(get_connection(), get_lsh(), tokens, LSH_CANDIDATE_LIMIT)
+    return fetch_candidates_by_id(doc_ids) if doc_ids else []
+
+def prepare_candidates(cand_rows, precleaned=None):
+    precleaned = USE_PRECLEANED if precleaned is None else precleaned
+    prepared = []
+    for row in cand_rows:
+        split_text, pc, ll = row[:3]
+        # Rows added after precompute_tokens.py last ran have NULL precleaned columns
+        if precleaned and None not in row[3:]:
+            cleaned_cand, tokens, eff_tokens, is_building = row[3:]
+            cand_tokens = set(tokens.split())
+            eff_cand = set(eff_tokens.split())
+            is_building = bool(int(is_building))
+        else:
+            cleaned_cand = clean_string(split_text)
+            cand_tokens = set(cleaned_cand.split())
+            eff_cand = {t for t in cand_tokens if t not in common_tokens}
+            is_building = has_building_keyword(cleaned_cand)
+        prepared.append((split_text, pc, ll, cleaned_cand, cand_tokens, eff_cand, is_building))
+    return prepared
+
+def get_candidates(postcode, input_tokens):
+    if CANDIDATE_SOURCE == "token_index":
+        return prepare_candidates(fetch_candidates_by_tokens(postcode, input_tokens))
+    if CANDIDATE_SOURCE == "mmap":
+        return prepare_candidates(open_candidate_file().fetch(postcode, CANDIDATE_LIMIT), precleaned=True)
+    if CANDIDATE_SOURCE == "parquet":
+        return prepare_candidates(open_parquet_candidates().fetch(postcode, CANDIDATE_LIMIT), precleaned=False)
+    return prepare_candidates(fetch_candidates(postcode))
+
+# --- Scheduling ---
+
+def estimate_candidate_counts(postcodes, limit=CANDIDATE_LIMIT):
+    counts = {}
+    month_marks = ",".join("?" for _ in RECENT_MONTHS)
+    conn = get_connection()
+    for i in range(0, len(postcodes), 500):
+        batch = postcodes[i:i + 500]
+        pc_marks = ",".join("?" for _ in batch)
+        rows = conn.execute(f"""
+            SELECT postcode, COUNT(*) FROM data_2025
+            WHERE postcode IN ({pc_marks}) AND data_date IN ({month_marks})
+            GROUP BY postcode
+        """, (*batch, *RECENT_MONTHS)).fetchall()
+        counts.update({str(pc): min(n, limit) for pc, n in rows})
+    return counts
+
+def schedule_postcode_batches(df, num_workers=NUM_WORKERS, batches_per_worker=BATCHES_PER_WORKER):
+    # Whole postcode groups go to a single worker so each candidate fetch runs once
+    postcodes = df["postcode"].astype(str).str.strip()
+    groups = postcodes.groupby(postcodes, sort=False).indices
+    if CANDIDATE_SOURCE == "mmap":
+        counts = {pc: min(open_candidate_file().count(pc), CANDIDATE_LIMIT) for pc in groups}
+    elif CANDIDATE_SOURCE == "parquet":
+        counts = {pc: min(n, CANDIDATE_LIMIT) for pc, n in open_parquet_candidates().counts(groups).items()}
+    else:
+        counts = estimate_candidate_counts(list(groups))
+    costs = {pc: len(pos) * max(counts.get(pc, 0), 1) for pc, pos in groups.items()}
+
+    # Largest groups first, packed into small batches that workers pull as they free up
+    target = sum(costs.values()) / (num_workers * batches_per_worker)
+    batches = []
+    current = []
+    current_cost = 0
+    for pc in sorted(costs, key=costs.get, reverse=True):
+        current.append(groups[pc])
+        current_cost += costs[pc]
+        if current_cost >= target:
+            batches.append(current)
+            current = []
+            current_cost = 0
+    if current:
+        batches.append(current)
+
+    return [df.iloc[np.concatenate(positions)] for positions in batches]
 
 # --- Matching Logic ---
 
-def process_chunk(chunk, shared_counter):
-    results = []
-    postcode_cache = {}
-
-    for idx, row in chunk.iterrows():  # ✅ Include original index
-        raw_address = str(row["full_address"])
-        input_postcode = str(row["postcode"]).strip()
+EMPTY_RESULT = {"LL": "", "Matched Key": "", "Score": 0}
 
-        cleaned = clean_string(raw_address)
-        input_tokens = set(cleaned.split())
-        eff_input = {t for t in input_tokens if t not in common_tokens}
-
-        if input_postcode in postcode_cache:
-            cand_rows = postcode_cache[input_postcode]
+def token_matrix(token_sets, vocab, grow):
+    # Binary row x token matrix; with grow=False unseen tokens are dropped since they can't overlap
+    indices = []
+    indptr = [0]
+    for tokens in token_sets:
+        if grow:
+            indices.extend(vocab.setdefault(t, len(vocab)) for t in tokens)
         else:
-            cand_rows = fetch_candidates(input_postcode)
-            postcode_cache[input_postcode] = cand_rows
-
-        if not cand_rows:
-            results.append((idx, {"LL": "", "Matched Key": "", "Score": 0}))  # ✅ Indexed
-            shared_counter.value += 1
-            continue  # ✅ Continue instead of return
-
-        pre_candidates = []
-        for split_text, pc, ll in cand_rows:
-            if pc != input_postcode:
-                continue
-            cleaned_cand = clean_string(split_text)
-            cand_tokens = set(cleaned_cand.split())
-            eff_cand = {t for t in cand_tokens if t not in common_tokens}
-            overlap = input_tokens & cand_tokens
-            if len(overlap) < OVERLAP_THRESHOLD:
-                continue
-            pre_candidates.append((split_text, pc, ll, cleaned_cand, cand_tokens, eff_cand))
-
-        candidates = []
-        for split_text, pc, ll, cleaned_cand, cand_tokens, eff_cand in pre_candidates:
-            overlap = input_tokens & cand_tokens
-            overlap_eff = eff_input & eff_cand
-            jaccard = len(overlap) / len(input_tokens | cand_tokens or [1])
-            ratio = fuzz.token_set_ratio(cleaned, cleaned_cand) / 100
-
-            if len(input_tokens) >= 6 and len(overlap) < OVERLAP_THRESHOLD:
-                continue
-            if ratio < FUZZY_THRESHOLD:
-                continue
-            if jaccard < JACCARD_THRESHOLD and len(overlap_eff) < 3:
-                continue
-            if len(input_tokens) < 6 and not has_building_keyword(cleaned):
-                continue
-
-            boost = 0.10 if has_building_keyword(cleaned) and has_building_keyword(cleaned_cand) else 0
-            penalty = 0.05 if has_building_keyword(cleaned) != has_building_keyword(cleaned_cand) else 0
-
-            score = ((0.3 * jaccard + 0.7 * ratio) if jaccard < 0.6 else (0.6 * jaccard + 0.4 * ratio))
-            score = (score + boost - penalty) * 100
-            score = min(score, 100)
-
-            candidates.append((score, ll, split_text, pc))
-
-        if candidates:
-            best = max(candidates, key=lambda x: x[0])
-            score, ll, raw_split, pc = best
-            if score >= SCORE_THRESHOLD:
+            indices.extend(vocab[t] for t in tokens if t in vocab)
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.int32)
+    return csr_matrix((data, indices, indptr), shape=(len(token_sets), len(vocab)))
+
+def score_block(inputs, cand_rows, input_postcode):
+    # All inputs of one postcode against that postcode's candidates, SCORE_BLOCK_ROWS
+    # inputs at a time so no dense matrix grows past block rows x candidates.
+    # input_postcode=None scores candidates from any postcode (LSH recovery).
+    if not cand_rows:
+        return [(idx, dict(EMPTY_RESULT)) for idx, *_ in inputs]
+
+    vocab = {}
+    cand_matrix = token_matrix([c[4] for c in cand_rows], vocab, grow=True)
+    eff_cols = np.array([t not in common_tokens for t in vocab], dtype=bool)
+    cand_t = cand_matrix.T.tocsr()
+    cand_eff_t = cand_matrix[:, eff_cols].T.tocsr()
+    same_pc = np.array([input_postcode is None or c[1] == input_postcode for c in cand_rows])
+    all_cand_len = np.array([len(c[4]) for c in cand_rows])
+    all_cand_building = np.array([c[6] for c in cand_rows], dtype=bool)
+
+    results = []
+    for start in range(0, len(inputs), SCORE_BLOCK_ROWS):
+        block = inputs[start:start + SCORE_BLOCK_ROWS]
+        input_matrix = token_matrix([tokens for _, _, tokens, _ in block], vocab, grow=False)
+
+        # Only the columns some input of this block can still match leave the sparse product
+        overlap_sparse = (input_matrix @ cand_t).tocsr()
+        used = np.unique(overlap_sparse.indices[overlap_sparse.data >= OVERLAP_THRESHOLD])
+        used = used[same_pc[used]]
+        if not used.size:
+            results.extend((idx, dict(EMPTY_RESULT)) for idx, *_ in block)
+            continue
+
+        overlap = overlap_sparse[:, used].toarray()
+        keep = overlap >= OVERLAP_THRESHOLD
+        eff_overlap = (input_matrix[:, eff_cols] @ cand_eff_t[:, used]).toarray()
+
+        rows = np.flatnonzero(keep.any(axis=1))
+        ratio = np.zeros(keep.shape)
+        ratio[rows] = process.cdist(
+            [block[i][1] for i in rows],
+            [cand_rows[j][3] for j in used],
+            scorer=fuzz.token_set_ratio,
+            score_cutoff=FUZZY_THRESHOLD * 100,
+            dtype=np.float64,
+            workers=CDIST_WORKERS,
+        ) / 100
+
+        input_len = np.array([len(tokens) for _, _, tokens, _ in block])
+        cand_len = all_cand_len[used]
+        union = input_len[:, None] + cand_len[None, :] - overlap
+        jaccard = overlap / np.where(union == 0, 1, union)
+
+        input_building = np.array([is_building for _, _, _, is_building in block], dtype=bool)
+        cand_building = all_cand_building[used]
+
+        keep &= ~((input_len >= 6)[:, None] & (overlap < OVERLAP_THRESHOLD))
+        keep &= ratio >= FUZZY_THRESHOLD
+        keep &= ~((jaccard < JACCARD_THRESHOLD) & (eff_overlap < 3))
+        keep &= ~((input_len < 6) & ~input_building)[:, None]
+
+        boost = np.where(input_building[:, None] & cand_building[None, :], 0.10, 0)
+        penalty = np.where(input_building[:, None] != cand_building[None, :], 0.05, 0)
+
+        score = np.where(jaccard < 0.6, 0.3 * jaccard + 0.7 * ratio, 0.6 * jaccard + 0.4 * ratio)
+        score = (score + boost - penalty) * 100
+        score = np.minimum(score, 100)
+        score = np.where(keep, score, -np.inf)
+
+        best_cols = score.argmax(axis=1)  # first max wins, same as max() over candidates in order
+        for i, (idx, *_) in enumerate(block):
+            best_score = score[i, best_cols[i]]
+            if best_score >= SCORE_THRESHOLD:
+                raw_split, pc, ll = cand_rows[used[best_cols[i]]][:3]
                 cleaned_match = clean_string(raw_split)
                 cleaned_match = remove_duplicate_postcode(f"{cleaned_match} {pc}")
                 result = {
                     "LL": ll,
                     "Matched Key": cleaned_match,
-                    "Score": round(score)
+                    "Score": round(float(best_score))
                 }
             else:
-                result = {
-                    "LL": "",
-                    "Matched Key": "",
-                    "Score": 0
-                }
-        else:
-            result = {
-                "LL": "",
-                "Matched Key": "",
-                "Score": 0
-            }
-
+                result = dict(EMPTY_RESULT)
+            results.append((idx, result))
+    return results
 
-        results.append((idx, result))  # ✅ Include index for proper alignment
-        shared_counter.value += 1
+def recover_unmatched(inputs, block_results):
+    # Rows the postcode block left unmatched, e.g. a mistyped or stale postcode,
+    # get near-duplicates from the whole corpus, confirmed by the same scorer
+    recovered = []
+    for inp, (idx, result) in zip(inputs, block_results):
+        if result["Score"] < SCORE_THRESHOLD and len(inp[2]) >= OVERLAP_THRESHOLD:
+            cand_rows = prepare_candidates(fetch_candidates_by_lsh(inp[2]))
+            if cand_rows:
+                idx, result = score_block([inp], cand_rows, None)[0]
+        recovered.append((idx, result))
+    return recovered
+
+def process_chunk(chunk):
+    results = []
+    postcodes = chunk["postcode"].astype(str).str.strip()
+
+    for input_postcode, group in chunk.groupby(postcodes, sort=False):
+        inputs = []
+        for idx, cleaned in group["cleaned_address"].items():  # ✅ Include original index, cleaned once in match_frame
+            inputs.append((idx, cleaned, set(cleaned.split()), has_building_keyword(cleaned)))
+
+        if CANDIDATE_SOURCE == "token_index":
+            # Candidates depend on each input's tokens
+            block_results = []
+            for inp in inputs:
+                block_results.extend(score_block([inp], get_candidates(input_postcode, inp[2]), input_postcode))
+        else:
+            block_results = score_block(inputs, get_candidates(input_postcode, None), input_postcode)
+        if USE_LSH_RECOVERY:
+            block_results = recover_unmatched(inputs, block_results)
+        results.extend(block_results)
+        worker_update(len(inputs))
 
+    worker_flush()
     return results
 
 
 # --- Main Function ---
 
+def open_match_cache():
+    if not USE_MATCH_CACHE:
+        return None
+    corpus_path = {"mmap": CANDIDATE_FILE, "parquet": PARQUET_PATH}.get(CANDIDATE_SOURCE, DB_PATH)
+    params = {
+        "corpus": file_version(corpus_path),
+        "source": CANDIDATE_SOURCE,
+        "months": RECENT_MONTHS,
+        "limit": CANDIDATE_LIMIT,
+        "thresholds": (OVERLAP_THRESHOLD, FUZZY_THRESHOLD, JACCARD_THRESHOLD, SCORE_THRESHOLD),
+        "common_tokens": sorted(common_tokens),
+        "building_keywords": building_keywords,
+    }
+    if USE_LSH_RECOVERY:
+        params["lsh"] = (file_version(DB_PATH), lsh_index_params(), LSH_CANDIDATE_LIMIT)
+    return MatchCache("tier2", params)
+
+def match_frame(df, pool, progress=None, cache=None, cleaned_addresses=None):
+    # cleaned_addresses: clean_string of each row, when the caller already has them
+    if cleaned_addresses is None:
+        cleaned_addresses = normalize_many(df["full_address"])
+    keys = list(zip(cleaned_addresses, df["postcode"].astype(str).str.strip()))
+    known = cache.get_many(set(keys)) if cache else {}
+    first_idx = {}
+    for idx, key in zip(df.index, keys):
+        if key not in known and key not in first_idx:
+            first_idx[key] = idx
+
+    todo = df.loc[list(first_idx.values())].assign(cleaned_address=[address for address, _ in first_idx])
+    if progress:
+        progress.add(len(df) - len(todo))
+    if len(todo):
+        all_results = pool.imap_unordered(process_chunk, schedule_postcode_batches(todo))
+        result_dict = {idx: res for chunk in all_results for idx, res in chunk}
+        fresh = {key: result_dict[idx] for key, idx in first_idx.items()}
+        if cache:
+            cache.put_many(fresh)
+        known.update(fresh)
+
+    df_result = df.copy()
+    df_result["LL"] = [known[key]["LL"] for key in keys]
+    df_result["Matched Key"] = [known[key]["Matched Key"] for key in keys]
+    df_result["%"] = [known[key]["Score"] for key in keys]
+    return df_result
+
 def debug_tier2_on_sample(filepath="C:/Users/User/Desktop/tier2_start.xlsx"):
-    df = pd.read_csv(filepath) if filepath.lower().endswith(".csv") else pd.read_excel(filepath)
+    df = pd.read_csv(filepath) if filepath.lower().endswith(".csv") else read_sheet(filepath)
     assert "full_address" in df.columns and "postcode" in df.columns, "Missing required columns"
 
-    manager = Manager()
-    shared_counter = manager.Value("i", 0)
     start_time = time.time()
-    chunks = [df.iloc[i::NUM_WORKERS] for i in range(NUM_WORKERS)]
-
-    with Pool(processes=NUM_WORKERS) as pool:
-        progress_thread = Thread(target=print_progress, args=(shared_counter, len(df), start_time))
-        progress_thread.start()
-
-        func = partial(process_chunk, shared_counter=shared_counter)
-        all_results = pool.map(func, chunks)
-        stop_event.set()
-        progress_thread.join()
 
-    # Flatten and re-index properly
-    result_dict = {idx: res for chunk in all_results for idx, res in chunk}
-    results_df = pd.DataFrame.from_dict(result_dict, orient="index").sort_index()
-
-    df_result = df.copy()
-    df_result["LL"] = results_df["LL"].values
-    df_result["Matched Key"] = results_df["Matched Key"].values
-    df_result["%"] = results_df["Score"].values
+    progress = SharedProgress(len(df), desc="Tier 2", bar_len=40)
+    with Pool(processes=NUM_WORKERS, initializer=init_worker, initargs=(progress.shared,)) as pool:
+        progress.start()
+        cache = open_match_cache()
+        df_result = match_frame(df, pool, progress, cache)
+        progress.close()
 
     output_path = os.path.join(os.path.expanduser("~"), "Desktop", "tier_2_match.csv")
     df_result.to_csv(output_path, index=False)
 
-    matched_count = sum(1 for score in results_df["Score"] if score >= SCORE_THRESHOLD)
+    matched_count = sum(1 for score in df_result["%"] if score >= SCORE_THRESHOLD)
     total_count = len(df)
     mins = int((time.time() - start_time) // 60)
     secs = int((time.time() - start_time) % 60)
 
-    print(f"\n\n Matched: {matched_count}/{total_count} | {round((matched_count/total_count)*100, 1)}% | Time: {mins}:{secs:02d}")
+    print(f"\n Matched: {matched_count}/{total_count} | {round((matched_count/total_count)*100, 1)}% | Time: {mins}:{secs:02d}")
+    print(f"✅ Debug CSV saved as {output_path}")
+
+# --- Streaming Mode ---
+
+def count_input_rows(filepath):
+    if filepath.lower().endswith(".csv"):
+        with open(filepath, "rb") as f:
+            return max(sum(1 for _ in f) - 1, 0)  # rough if addresses hold quoted newlines, only used for the bar
+    wb = load_workbook(filepath, read_only=True)
+    total = max((wb.worksheets[0].max_row or 1) - 1, 0)  # first sheet, same as read_excel
+    wb.close()
+    return total
+
+def iter_input_chunks(filepath, chunk_rows=STREAM_CHUNK_ROWS, skip_rows=0):
+    # Index continues across chunks so every row keeps its position in the whole file
+    if filepath.lower().endswith(".csv"):
+        reader = pd.read_csv(filepath, chunksize=chunk_rows, skiprows=range(1, skip_rows + 1))
+        for chunk in reader:
+            chunk.index = chunk.index + skip_rows
+            yield chunk
+        return
+
+    wb = load_workbook(filepath, read_only=True)
+    rows = wb.worksheets[0].iter_rows(values_only=True)  # first sheet, not whichever was saved active
+    header = list(next(rows))
+    start = skip_rows
+    batch = []
+    for i, values in enumerate(rows):
+        if i < skip_rows:
+            continue
+        batch.append(values)
+        if len(batch) >= chunk_rows:
+            yield pd.DataFrame(batch, columns=header, index=range(start, start + len(batch)))
+            start += len(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=header, index=range(start, start + len(batch)))
+    wb.close()
+
+def load_checkpoint(checkpoint_path, filepath):
+    if not os.path.isfile(checkpoint_path):
+        return None
+    with open(checkpoint_path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    stat = os.stat(filepath)
+    if checkpoint.get("input") != os.path.abspath(filepath) or checkpoint.get("input_mtime") != stat.st_mtime:
+        return None  # different or edited input, start over
+    return checkpoint
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+def debug_tier2_streaming(filepath="C:/Users/User/Desktop/tier2_start.xlsx", output_path=None, chunk_rows=STREAM_CHUNK_ROWS):
+    output_path = output_path or os.path.join(os.path.expanduser("~"), "Desktop", "tier_2_match.csv")
+    checkpoint_path = output_path + ".checkpoint.json"
+    start_time = time.time()
+
+    checkpoint = load_checkpoint(checkpoint_path, filepath)
+    if checkpoint and os.path.isfile(output_path):
+        # Drop anything written after the last checkpoint, e.g. a chunk cut off mid-write
+        with open(output_path, "r+b") as f:
+            f.truncate(checkpoint["output_bytes"])
+        print(f"↩️ Resuming after row {checkpoint['rows_done']} of {filepath}")
+    else:
+        checkpoint = {
+            "input": os.path.abspath(filepath),
+            "input_mtime": os.stat(filepath).st_mtime,
+            "rows_done": 0,
+            "matched": 0,
+            "output_bytes": 0,
+        }
+        if os.path.isfile(output_path):
+            os.remove(output_path)
+
+    progress = SharedProgress(count_input_rows(filepath), desc="Tier 2", bar_len=40)
+    progress.shared.value = checkpoint["rows_done"]
+    try:
+        with Pool(processes=NUM_WORKERS, initializer=init_worker, initargs=(progress.shared,)) as pool:
+            progress.start()
+            cache = open_match_cache()
+            for chunk in iter_input_chunks(filepath, chunk_rows, checkpoint["rows_done"]):
+                assert "full_address" in chunk.columns and "postcode" in chunk.columns, "Missing required columns"
+                df_result = match_frame(chunk, pool, progress, cache)
+
+                with open(output_path, "a", encoding="utf-8", newline="") as f:
+                    df_result.to_csv(f, header=checkpoint["output_bytes"] == 0, index=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                checkpoint["output_bytes"] = os.path.getsize(output_path)
+
+                checkpoint["rows_done"] += len(chunk)
+                checkpoint["matched"] += int((df_result["%"] >= SCORE_THRESHOLD).sum())
+                save_checkpoint(checkpoint_path, checkpoint)
+    except KeyboardInterrupt:
+        progress.close()
+        print(f"\n⏸️ Stopped after row {checkpoint['rows_done']}, rerun to resume from {checkpoint_path}")
+        return
+    progress.close()
+    if os.path.isfile(checkpoint_path):
+        os.remove(checkpoint_path)  # finished, the next run starts fresh
+
+    matched_count = checkpoint["matched"]
+    total_count = checkpoint["rows_done"]
+    mins = int((time.time() - start_time) // 60)
+    secs = int((time.time() - start_time) % 60)
+
+    print(f"\n Matched: {matched_count}/{total_count} | {round((matched_count/max(total_count, 1))*100, 1)}% | Time: {mins}:{secs:02d}")
     print(f"✅ Debug CSV saved as {output_path}")
 
 
 # --- Run ---
 if __name__ == "__main__":
-    debug_tier2_on_sample("C:/Users/User/Desktop/tier2_start.xlsx")
+    if STREAMING:
+        debug_tier2_streaming("C:/Users/User/Desktop/tier2_start.xlsx")
+    else:
+        debug_tier2_on_sample("C:/Users/User/Desktop/tier2_start.xlsx")
 
 # 202507 = 1089894
 # 202506 = 3435568
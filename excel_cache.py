@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# --- Configuration ---
+SIDECAR_DIR = os.path.join(os.path.expanduser("~"), "Desktop", "excel_cache")
+SIDECAR_VERSION = 1  # bump when the sidecar layout or the value encoding changes
+USE_SIDECARS = True
+
+try:
+    import python_calamine  # noqa: F401  Rust reader, several times faster than openpyxl
+    ENGINE = "calamine"
+except ImportError:
+    ENGINE = None  # pandas default, openpyxl for xlsx
+
+# --- Layout ---
+# One folder per workbook (named by a hash of its path) holding a Parquet file
+# per sheet plus meta.json. A sidecar is reused while the workbook's size and
+# mtime are unchanged; if only the mtime moved (copied, re-saved untouched) the
+# content hash decides. Sheets are cached whole so any later usecols is served
+# by a columnar read of just those columns.
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def workbook_dir(path):
+    return os.path.join(SIDECAR_DIR, hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16])
+
+def sheet_file(sheet_name):
+    return hashlib.sha1(repr(sheet_name).encode("utf-8")).hexdigest()[:16] + ".parquet"
+
+def load_meta(folder, path):
+    # meta.json if it still describes this workbook, otherwise a fresh one (stale sheets dropped)
+    stat = os.stat(path)
+    version = {"version": SIDECAR_VERSION, "engine": ENGINE}
+    try:
+        with open(os.path.join(folder, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = None
+    if meta and meta.get("format") == version:
+        if (meta["size"], meta["mtime"]) == (stat.st_size, stat.st_mtime):
+            return meta
+        if meta["size"] == stat.st_size and meta["sha256"] == file_hash(path):
+            meta["mtime"] = stat.st_mtime
+            save_meta(folder, meta)
+            return meta
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder, exist_ok=True)
+    return {"format": version, "size": stat.st_size, "mtime": stat.st_mtime, "sha256": file_hash(path), "sheets": {}}
+
+def save_meta(folder, meta):
+    tmp_path = os.path.join(folder, "meta.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(folder, "meta.json"))
+
+# --- Encoding ---
+# Parquet needs one type per column, but read_excel gives mixed object columns
+# (a postcode column with 43000, "43000-1" and NaN). Those are stored as JSON
+# text per cell so ints, floats, strings and NaN come back exactly as parsed.
+
+def encode_frame(df):
+    if not all(isinstance(c, str) for c in df.columns):
+        return None, None  # Parquet needs string headers
+    df = df.copy()
+    json_columns = []
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        kinds = {type(v) for v in df[col] if not (isinstance(v, float) and v != v)}
+        if kinds <= {str}:
+            continue  # plain text with NaN gaps, restored in decode_frame
+        if not kinds <= {str, int, float, bool}:
+            return None, None  # datetimes etc. mixed in, not worth a custom encoding
+        df[col] = [json.dumps(v) for v in df[col]]
+        json_columns.append(col)
+    return df, json_columns
+
+def decode_frame(df, json_columns):
+    for col in df.columns:
+        if col in json_columns:
+            df[col] = pd.Series([json.loads(v) for v in df[col]], index=df.index, dtype=object)
+        elif df[col].dtype == object:
+            df[col] = df[col].where(df[col].notna(), float("nan"))  # Parquet nulls come back as None
+    return df
+
+# --- Loader ---
+
+def select_columns(columns, usecols):
+    # Same shapes pandas accepts for a list: all positions or all names, kept in sheet order
+    if usecols is None:
+        return list(columns)
+    wanted = set(usecols)
+    if all(isinstance(c, int) for c in wanted):
+        return [c for i, c in enumerate(columns) if i in wanted]
+    missing = wanted - set(columns)
+    if missing:
+        raise ValueError(f"Usecols do not match columns, columns expected but not found: {sorted(missing)}")
+    return [c for c in columns if c in wanted]
+
+def pick_columns(df, usecols):
+    return df if usecols is None else df[select_columns(df.columns, usecols)].copy()
+
+def read_sheet(path, sheet_name=0, usecols=None):
+    # Drop-in for pd.read_excel(path, sheet_name=..., usecols=...) on one sheet
+    if not USE_SIDECARS:
+        return pick_columns(pd.read_excel(path, sheet_name=sheet_name, engine=ENGINE), usecols)
+
+    folder = workbook_dir(path)
+    meta = load_meta(folder, path)
+    entry = meta["sheets"].get(repr(sheet_name))
+    if entry:
+        columns = select_columns(entry["columns"], usecols)
+        table = pq.read_table(os.path.join(folder, entry["file"]), columns=columns)
+        return decode_frame(table.to_pandas(), entry["json_columns"])
+
+    df = pd.read_excel(path, sheet_name=sheet_name, engine=ENGINE)
+    encoded, json_columns = encode_frame(df)
+    if encoded is not None:
+        tmp_path = os.path.join(folder, sheet_file(sheet_name) + ".tmp")
+        pq.write_table(pa.Table.from_pandas(encoded, preserve_index=False), tmp_path)
+        os.replace(tmp_path, os.path.join(folder, sheet_file(sheet_name)))
+        meta["sheets"][repr(sheet_name)] = {
+            "file": sheet_file(sheet_name),
+            "columns": list(df.columns),
+            "json_columns": json_columns,
+        }
+        save_meta(folder, meta)
+    return pick_columns(df, usecols)
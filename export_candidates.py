@@ -0,0 +1,53 @@
+import os
+import sqlite3
+import time
+
+from candidate_file import CandidateFileWriter
+from debug_tier2_test import DB_PATH, RECENT_MONTHS, CANDIDATE_FILE
+from precompute_tokens import normalize_split
+
+# --- Export ---
+
+def export_candidates(db_path=DB_PATH, out_path=CANDIDATE_FILE, months=RECENT_MONTHS):
+    conn = sqlite3.connect(db_path)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(data_2025)")}
+    precleaned = {"cleaned", "tokens", "eff_tokens", "is_building"} <= columns
+    select = "split, postcode, LL, cleaned, tokens, eff_tokens, is_building" if precleaned else "split, postcode, LL"
+
+    month_marks = ",".join("?" for _ in months)
+    recency = " ".join(f"WHEN ? THEN {rank}" for rank in range(len(months)))
+    postcodes = [row[0] for row in conn.execute(
+        f"SELECT DISTINCT postcode FROM data_2025 WHERE data_date IN ({month_marks})", months
+    )]
+
+    tmp_path = out_path + ".tmp"
+    writer = CandidateFileWriter(tmp_path, months)
+    start_time = time.time()
+    total = 0
+    for i, postcode in enumerate(postcodes, 1):
+        # Same recency order fetch_candidates walks, so LIMIT slices agree
+        rows = conn.execute(f"""
+            SELECT {select} FROM data_2025
+            WHERE postcode = ? AND data_date IN ({month_marks})
+            ORDER BY CASE data_date {recency} END, rowid
+        """, (postcode, *months, *months)).fetchall()
+        # Rows added after precompute_tokens.py last ran have NULL precleaned columns
+        rows = [
+            row if precleaned and None not in row[3:] else (*row[:3], *normalize_split(row[0]))
+            for row in rows
+        ]
+        writer.add_segment(postcode, rows)
+        total += len(rows)
+        print(f"\r📦 {i}/{len(postcodes)} postcodes | {total:,} rows | {int(time.time() - start_time)}s", end="", flush=True)
+
+    writer.close()
+    conn.close()
+    os.replace(tmp_path, out_path)
+    print(f"\n✅ Candidate file saved to {out_path} ({os.path.getsize(out_path) / 1e9:.2f} GB)")
+
+
+if __name__ == "__main__":
+    export_candidates()
+
+#rerun whenever RECENT_MONTHS changes or new data lands in data_2025
+#set CANDIDATE_SOURCE = "mmap" in debug_tier2_test.py afterwards
@@ -0,0 +1,127 @@
+import re
+from collections import deque
+
+# --- Token Matching ---
+# has_building_keyword in the tier scripts checks set(kw.split()) & text_tokens for
+# every keyword, i.e. whether any token of any keyword is a token of the text. The
+# union of keyword tokens answers that with one set lookup per text token.
+
+def compile_keyword_tokens(keywords):
+    return frozenset(tok for kw in keywords for tok in kw.lower().split())
+
+def has_keyword_token(text, keyword_tokens):
+    return not keyword_tokens.isdisjoint(text.lower().split())
+
+# --- Phrase Matching ---
+# Substring semantics, same as any(kw in text for kw in keywords), in one regex scan.
+
+def compile_keyword_pattern(keywords):
+    keywords = sorted(set(keywords), key=len, reverse=True)
+    if not keywords:
+        return re.compile(r"(?!)")
+    return re.compile("|".join(re.escape(kw) for kw in keywords))
+
+def has_keyword_phrase(text, pattern):
+    return pattern.search(text) is not None
+
+# --- Multi-Pattern Matching ---
+# Aho-Corasick: every keyword compiled into one automaton, so a text is scanned
+# once and all contained keywords come out, however long the keyword list is.
+
+class KeywordAutomaton:
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        for i, kw in enumerate(self.keywords):
+            if not kw:
+                continue  # an empty keyword would match at every position
+            state = 0
+            for ch in kw:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                state = nxt
+            self.output[state] += (i,)
+
+        # Breadth-first, so a state's fail target (always shallower) is finished first
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(ch, 0)
+                self.output[nxt] += self.output[self.fail[nxt]]
+
+    def iter_matches(self, text):
+        # Yields (start, keyword index) for every occurrence, overlapping ones included
+        goto, fail, output, keywords = self.goto, self.fail, self.output, self.keywords
+        state = 0
+        for pos, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for i in output[state]:
+                yield pos - len(keywords[i]) + 1, i
+
+    def find_all(self, text):
+        return {i for _, i in self.iter_matches(text)}
+
+# --- Classification ---
+# Categories are keyword lists in priority order, all compiled into one automaton.
+# word_boundary=True gives re's \bkw\b semantics, False plain substring tests.
+
+def is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+def at_word_boundary(text, pos):
+    before = pos > 0 and is_word_char(text[pos - 1])
+    after = pos < len(text) and is_word_char(text[pos])
+    return before != after
+
+class KeywordClassifier:
+    def __init__(self, categories, word_boundary=True):
+        self.labels = list(categories)
+        keywords, owners = [], []
+        for owner, label in enumerate(self.labels):
+            for kw in categories[label]:
+                keywords.append(kw.lower())
+                owners.append(owner)
+        self.automaton = KeywordAutomaton(keywords)
+        self.owners = owners
+        self.word_boundary = word_boundary
+
+    def categories(self, text):
+        # Every category with at least one keyword in text, in priority order
+        text = text.lower()
+        found = set()
+        for start, i in self.automaton.iter_matches(text):
+            owner = self.owners[i]
+            if owner in found:
+                continue
+            if self.word_boundary:
+                end = start + len(self.automaton.keywords[i])
+                if not (at_word_boundary(text, start) and at_word_boundary(text, end)):
+                    continue
+            found.add(owner)
+        return [self.labels[owner] for owner in sorted(found)]
+
+    def classify(self, text, default="Unknown"):
+        found = self.categories(text)
+        return found[0] if found else default
+
+    def categories_many(self, texts):
+        # Distinct texts are scanned once
+        seen = {}
+        return [seen[t] if t in seen else seen.setdefault(t, self.categories(t)) for t in texts]
+
+    def classify_many(self, texts, default="Unknown"):
+        return [found[0] if found else default for found in self.categories_many(texts)]
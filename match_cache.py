@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+# --- Configuration ---
+CACHE_PATH = os.path.join(os.path.expanduser("~"), "Desktop", "match_cache.sqlite")
+
+def fingerprint(params):
+    # Anything that can change a result (months, thresholds, corpus/reference version) goes in params
+    payload = json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+def file_version(path):
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime}"
+
+# --- Cache ---
+
+class MatchCache:
+    # Results keyed by (normalized address, postcode) under one matcher + version.
+    # A result only depends on the cleaned address and postcode, so matchers score
+    # each distinct pair once per run and skip the pairs already cached here.
+    def __init__(self, matcher, params, path=None):
+        self.matcher = matcher
+        self.version = fingerprint(params)
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path or CACHE_PATH)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS match_cache (
+                matcher TEXT,
+                version TEXT,
+                address TEXT,
+                postcode TEXT,
+                result TEXT,
+                PRIMARY KEY (matcher, version, address, postcode)
+            ) WITHOUT ROWID
+        """)
+        # Results from older versions of this matcher can never be hit again
+        self.conn.execute("DELETE FROM match_cache WHERE matcher = ? AND version != ?", (matcher, self.version))
+        self.conn.commit()
+
+    def get_many(self, keys):
+        # Keys go into a temp table and one join looks them all up, instead of a
+        # SELECT per key; pos maps each row back to the caller's own key
+        keys = list(keys)
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS lookup_keys (pos INTEGER, address TEXT, postcode TEXT)")
+        self.conn.executemany(
+            "INSERT INTO lookup_keys VALUES (?, ?, ?)",
+            [(pos, address, postcode) for pos, (address, postcode) in enumerate(keys)]
+        )
+        rows = self.conn.execute("""
+            SELECT k.pos, c.result FROM lookup_keys k
+            JOIN match_cache c
+              ON c.matcher = ? AND c.version = ? AND c.address = k.address AND c.postcode = k.postcode
+        """, (self.matcher, self.version)).fetchall()
+        self.conn.execute("DELETE FROM lookup_keys")
+        self.conn.commit()
+        found = {keys[pos]: json.loads(result) for pos, result in rows}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, results):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO match_cache VALUES (?, ?, ?, ?, ?)",
+            [
+                (self.matcher, self.version, address, postcode, json.dumps(result))
+                for (address, postcode), result in results.items()
+            ]
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,57 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as fs
+
+# --- Layout ---
+# Written by the convert script: hive partitions on data_date, rows sorted by
+# postcode inside each partition so row-group stats can skip most of a file.
+PARTITIONING = ds.partitioning(pa.schema([("data_date", pa.string())]), flavor="hive")
+
+class ParquetCandidates:
+    def __init__(self, path, months=None, columns=("split", "postcode", "LL")):
+        dataset = ds.dataset(
+            path,
+            format="parquet",
+            partitioning=PARTITIONING,
+            filesystem=fs.LocalFileSystem(use_mmap=True),
+        )
+        self.schema = dataset.schema
+        self.columns = list(columns)
+
+        # Fragments grouped per month, newest first when months are given, so a
+        # fetch can stop as soon as the limit is filled like the SQLite window
+        by_month = {}
+        for fragment in dataset.get_fragments():
+            month = ds.get_partition_keys(fragment.partition_expression).get("data_date")
+            if months is None or month in months:
+                fragment.ensure_complete_metadata()  # row-group stats loaded once, not per fetch
+                by_month.setdefault(month, []).append(fragment)
+        order = months if months is not None else sorted(by_month)
+        self.fragments = [
+            (month, fragment)
+            for month in order
+            for fragment in sorted(by_month.get(month, []), key=lambda f: (len(f.path), f.path))  # part-2 before part-10
+        ]
+
+    def fetch(self, postcode, limit=None):
+        condition = ds.field("postcode") == postcode
+        results = []
+        for _, fragment in self.fragments:
+            matching = fragment.subset(condition)  # drops row groups whose min/max rule the postcode out
+            if matching.num_row_groups:
+                table = matching.to_table(schema=self.schema, columns=self.columns, filter=condition)
+                results.extend(zip(*(table.column(c).to_pylist() for c in self.columns)))
+            if limit and len(results) >= limit:
+                return results[:limit]
+        return results
+
+    def counts(self, postcodes):
+        wanted = pa.array(list(postcodes), type=pa.string())
+        condition = ds.field("postcode").isin(wanted)
+        totals = {}
+        for _, fragment in self.fragments:
+            table = fragment.to_table(schema=self.schema, columns=["postcode"], filter=condition)
+            for item in pc.value_counts(table.column("postcode")).to_pylist():
+                totals[item["values"]] = totals.get(item["values"], 0) + item["counts"]
+        return totals
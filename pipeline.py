@@ -0,0 +1,131 @@
+import os
+import time
+from multiprocessing import Pool
+
+import pandas as pd
+
+import av_model
+import debug_tier2_test as tier2
+import test_2 as tier1
+from address_normalizer import normalize_many
+from excel_cache import read_sheet
+from progress import SharedProgress, init_worker
+
+# --- Configuration ---
+INPUT_PATH = "C:/Users/User/Desktop/pipeline.xlsx"  # 'Input' and 'Nodes' sheets, 'Reference' for the TF-IDF tier
+OUTPUT_PATH = os.path.join(os.path.expanduser("~"), "Desktop", "pipeline_match.csv")
+TIERS = ("exact", "nodes", "core", "tfidf")  # cheapest first, drop one to skip it
+
+# Each tier only sees the rows every earlier tier left unmatched
+SOURCES = {"exact": "Exact", "nodes": "Nodes", "core": "Core", "tfidf": "TF-IDF"}
+MATCH_COLUMNS = ["LL", "Matched Key", "Score"]
+
+# --- Normalization ---
+
+def normalize_input(df):
+    # Every cleaning profile a tier needs, each distinct address cleaned once per
+    # profile, instead of every script re-cleaning its own copy of the input
+    addresses = df["full_address"].astype(str)
+    return pd.DataFrame({
+        "basic": normalize_many(addresses, "basic"),  # exact, core (tier-2)
+        "alnum": normalize_many(addresses, "alnum"),  # nodes (tier-1)
+        "abbrev": normalize_many(addresses, "abbrev"),  # tfidf (av_model)
+        "postcode": df["postcode"].astype(str),
+    }, index=df.index)
+
+def found_frame(found):
+    # {index: (LL, Matched Key, Score)} of the rows a tier matched
+    return pd.DataFrame.from_dict(found, orient="index", columns=MATCH_COLUMNS) if found else pd.DataFrame(columns=MATCH_COLUMNS)
+
+# --- Tiers ---
+
+def match_exact(df, norm, postcode_node_map):
+    # Cleaned address equal to a node key in the same postcode, with or without
+    # the postcode written at the end
+    index = {}
+    for postcode, nodes in postcode_node_map.items():
+        for node in nodes:
+            index.setdefault((node["cleaned_key"], postcode), node)
+            index.setdefault((tier1.remove_duplicate_postcode(f"{node['cleaned_key']} {postcode}"), postcode), node)
+
+    found = {}
+    for idx, cleaned, postcode in zip(df.index, norm["basic"], norm["postcode"]):
+        node = index.get((tier1.remove_duplicate_postcode(cleaned), postcode))
+        if node:
+            found[idx] = (node["ll"], tier1.remove_duplicate_postcode(f"{node['key']} {node['postcode']}"), 100)
+    return found_frame(found)
+
+def match_nodes(df, norm, postcode_node_map, cache):
+    results = tier1.run_tier1(df, postcode_node_map, cache, cleaned_addresses=list(norm["alnum"]))
+    return found_frame({idx: result[:3] for idx, result in zip(df.index, results) if result[3]})
+
+def match_core(df, norm):
+    progress = SharedProgress(len(df), desc="Core", bar_len=40)
+    with Pool(processes=tier2.NUM_WORKERS, initializer=init_worker, initargs=(progress.shared,)) as pool:
+        progress.start()
+        cache = tier2.open_match_cache()
+        df_result = tier2.match_frame(df[["full_address", "postcode"]], pool, progress, cache, cleaned_addresses=norm["basic"])
+        progress.close()
+    matched = df_result[df_result["%"] >= tier2.SCORE_THRESHOLD]
+    return found_frame({idx: (row["LL"], row["Matched Key"], row["%"]) for idx, row in matched.iterrows()})
+
+def match_tfidf(df, norm, df_reference, filepath):
+    reference_hash = av_model.reference_hash_of(df_reference)
+    node_pool, vectorizer, ref_matrix, ref_t = av_model.load_reference(df_reference, reference_hash, filepath)
+    cache = av_model.open_match_cache(reference_hash)
+    keys = list(zip(norm["abbrev"], norm["postcode"]))
+    known = av_model.match_keys(keys, node_pool, vectorizer, ref_matrix, ref_t, cache)
+    return found_frame({idx: tuple(known[key][:3]) for idx, key in zip(df.index, keys) if known[key][2]})
+
+# --- Main Function ---
+
+def run_pipeline(filepath=INPUT_PATH, output_path=OUTPUT_PATH, tiers=TIERS):
+    start_time = time.time()
+    df_input = read_sheet(filepath, sheet_name="Input")
+    assert "full_address" in df_input.columns and "postcode" in df_input.columns, "Missing required columns"
+    norm = normalize_input(df_input)
+
+    results = pd.DataFrame({"LL": "", "Matched Key": "", "Score": 0, "Source": ""}, index=df_input.index)
+    results = results.astype({"LL": object, "Matched Key": object})
+
+    postcode_node_map = None
+    for tier in tiers:
+        todo = results.index[results["Source"] == ""]
+        if not len(todo):
+            break
+        df, tier_norm = df_input.loc[todo], norm.loc[todo]
+        print(f"\n🔍 {SOURCES[tier]}: {len(todo)} rows")
+
+        if tier in ("exact", "nodes") and postcode_node_map is None:
+            df_nodes = read_sheet(filepath, sheet_name="Nodes", usecols=[0, 1, 2])
+            postcode_node_map = tier1.build_node_map(df_nodes)
+        if tier == "exact":
+            found = match_exact(df, tier_norm, postcode_node_map)
+        elif tier == "nodes":
+            found = match_nodes(df, tier_norm, postcode_node_map, tier1.open_match_cache(df_nodes))
+        elif tier == "core":
+            found = match_core(df, tier_norm)
+        else:
+            found = match_tfidf(df, tier_norm, read_sheet(filepath, sheet_name="Reference", usecols=[0, 1, 2]), filepath)
+
+        for col in MATCH_COLUMNS:
+            results.loc[found.index, col] = found[col]
+        results.loc[found.index, "Source"] = SOURCES[tier]
+        print(f"✅ {SOURCES[tier]}: matched {len(found)}")
+
+    df_output = df_input.copy()
+    for col in results.columns:
+        df_output[col] = results[col]
+    df_output.to_csv(output_path, index=False)
+
+    matched_count = int((results["Source"] != "").sum())
+    total_count = len(df_input)
+    mins = int((time.time() - start_time) // 60)
+    secs = int((time.time() - start_time) % 60)
+    print(f"\n Matched: {matched_count}/{total_count} | {round((matched_count / max(total_count, 1)) * 100, 1)}% | Time: {mins}:{secs:02d}")
+    print(results["Source"].replace("", "Unmatched").value_counts().to_string())
+    print(f"✅ Saved to {output_path}")
+
+
+if __name__ == "__main__":
+    run_pipeline()
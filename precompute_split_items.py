@@ -0,0 +1,82 @@
+import ast
+import sqlite3
+import time
+
+# --- Configuration ---
+DB_PATH = "C:/Users/User/Desktop/Core.sqlite"
+TABLE = "data_df"
+BATCH_SIZE = 50000
+SPLIT_SEP = "\x1f"  # unit separator, never part of an address token
+
+# split holds a Python list literal. split_items keeps the same items joined
+# by SPLIT_SEP so Tera only needs a str.split() instead of parsing each row.
+# Empty lists and unparseable values are stored as "" and skipped.
+
+# --- Utility Functions ---
+
+def has_column(conn, table, name):
+    return name in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def parse_split(split_raw):
+    # literal_eval only accepts literals, so a bad row can't run code like eval could
+    if not split_raw:
+        return None
+    try:
+        if not isinstance(split_raw, str):
+            return list(split_raw)  # a numeric cell is not iterable and is skipped
+        return list(ast.literal_eval(split_raw))
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+def join_split_items(split_raw):
+    items = parse_split(split_raw)
+    if not items:
+        return ""
+    return SPLIT_SEP.join(str(item).replace(SPLIT_SEP, " ") for item in items)
+
+def split_item_tokens(split_items):
+    return set(split_items.split(SPLIT_SEP)) if split_items else None
+
+# --- Ingestion ---
+
+def precompute_split_items(db_path=DB_PATH, table=TABLE, batch_size=BATCH_SIZE):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    if not has_column(conn, table, "split_items"):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN split_items TEXT")
+        conn.commit()
+
+    start_time = time.time()
+    last_rowid = 0
+    done = 0
+    while True:
+        # Walk by rowid so a rerun only fills rows that are still missing
+        rows = conn.execute(f"""
+            SELECT rowid, split FROM {table}
+            WHERE rowid > ? AND split_items IS NULL
+            ORDER BY rowid
+            LIMIT ?
+        """, (last_rowid, batch_size)).fetchall()
+        if not rows:
+            break
+
+        conn.executemany(
+            f"UPDATE {table} SET split_items = ? WHERE rowid = ?",
+            [(join_split_items(split_raw), rowid) for rowid, split_raw in rows]
+        )
+        conn.commit()
+
+        last_rowid = rows[-1][0]
+        done += len(rows)
+        print(f"\r🧹 Parsed {done:,} rows | {int(time.time() - start_time)}s", end="", flush=True)
+
+    conn.close()
+    print(f"\n✅ split_items ready on {table} ({done:,} rows updated)")
+
+
+if __name__ == "__main__":
+    precompute_split_items()
+
+#one time run for Core.sqlite, rerun only picks up rows where split_items is still NULL
+#Tera_match_generator.py reads split_items when the column exists and falls back to parsing split
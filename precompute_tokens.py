@@ -0,0 +1,76 @@
+import sqlite3
+import time
+
+from debug_tier2_test import DB_PATH, clean_string, common_tokens, has_building_keyword
+
+# --- Configuration ---
+TABLE = "data_2025"
+BATCH_SIZE = 50000
+
+# Columns written next to split/LL. Token sets are stored space-joined so
+# tier-2 only needs a str.split() to rebuild them.
+PRECLEANED_COLUMNS = {
+    "cleaned": "TEXT",
+    "tokens": "TEXT",
+    "eff_tokens": "TEXT",
+    "is_building": "INTEGER",
+}
+
+# --- Utility Functions ---
+
+def add_missing_columns(conn, table, columns):
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, col_type in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}")
+    conn.commit()
+
+def normalize_split(split_text):
+    cleaned = clean_string(split_text)
+    tokens = set(cleaned.split())
+    eff_tokens = {t for t in tokens if t not in common_tokens}
+    return cleaned, " ".join(sorted(tokens)), " ".join(sorted(eff_tokens)), int(has_building_keyword(cleaned))
+
+# --- Ingestion ---
+
+def precompute_tokens(db_path=DB_PATH, table=TABLE, batch_size=BATCH_SIZE):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    add_missing_columns(conn, table, PRECLEANED_COLUMNS)
+
+    start_time = time.time()
+    last_rowid = 0
+    done = 0
+    while True:
+        # Walk by rowid so a rerun only fills rows that are still missing.
+        # is_building is the newest column, so older runs get topped up too.
+        rows = conn.execute(f"""
+            SELECT rowid, split FROM {table}
+            WHERE rowid > ? AND is_building IS NULL
+            ORDER BY rowid
+            LIMIT ?
+        """, (last_rowid, batch_size)).fetchall()
+        if not rows:
+            break
+
+        updates = [(*normalize_split(split_text), rowid) for rowid, split_text in rows]
+        conn.executemany(
+            f"UPDATE {table} SET cleaned = ?, tokens = ?, eff_tokens = ?, is_building = ? WHERE rowid = ?",
+            updates
+        )
+        conn.commit()
+
+        last_rowid = rows[-1][0]
+        done += len(rows)
+        print(f"\r🧹 Pre-cleaned {done:,} rows | {int(time.time() - start_time)}s", end="", flush=True)
+
+    conn.close()
+    print(f"\n✅ Token columns ready on {table} ({done:,} rows updated)")
+
+
+if __name__ == "__main__":
+    precompute_tokens()
+
+#one time run, rerun only picks up rows where is_building is still NULL
+#set USE_PRECLEANED = True in debug_tier2_test.py afterwards
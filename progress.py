@@ -0,0 +1,143 @@
+import sys
+from collections import Counter
+from multiprocessing import Value
+from threading import Event, Thread
+from time import perf_counter
+
+# --- Configuration ---
+RENDER_INTERVAL = 0.5  # seconds between redraws, updates in between only bump counters
+FLUSH_EVERY = 256  # rows a worker batches locally before touching shared memory
+
+def format_duration(seconds):
+    mins, secs = divmod(int(seconds), 60)
+    return f"{mins:02d}:{secs:02d}"
+
+# --- Single Process ---
+
+class Progress:
+    def __init__(self, total, desc="Progress", bar_len=30, interval=RENDER_INTERVAL, stream=sys.stdout):
+        self.total = total
+        self.desc = desc
+        self.bar_len = bar_len
+        self.interval = interval
+        self.stream = stream
+        self.count = 0
+        self.metrics = Counter()
+        self.start_time = perf_counter()
+        self._last_render = 0.0
+        self._closed = False
+
+    def update(self, n=1, **metrics):
+        self.count += n
+        if metrics:
+            self.metrics.update(metrics)
+        now = perf_counter()
+        if now - self._last_render >= self.interval:
+            self.render(now)
+
+    def set(self, count):
+        self.count = count
+        now = perf_counter()
+        if now - self._last_render >= self.interval:
+            self.render(now)
+
+    def track(self, iterable):
+        # Drop-in for tqdm(iterable): a row counts once the loop body asks for the next one
+        for item in iterable:
+            yield item
+            self.update()
+        self.close()
+
+    def render(self, now=None):
+        now = perf_counter() if now is None else now
+        self._last_render = now
+        total = max(self.total, 1)
+        percent = min(self.count / total, 1.0)
+        filled_len = int(self.bar_len * percent)
+        bar = '█' * filled_len + '-' * (self.bar_len - filled_len)
+        elapsed = now - self.start_time
+        eta = elapsed / percent * (1 - percent) if percent else 0
+        line = (
+            f"\r⏳ {self.desc} [{bar}] {int(percent * 100)}% ({self.count}/{self.total})"
+            f" | ⏱️ {format_duration(elapsed)} | ETA: {format_duration(eta)}"
+        )
+        for name, value in self.metrics.items():
+            line += f" | {name}: {value}"
+        self.stream.write(line)
+        self.stream.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.render()
+        self.stream.write("\n")
+        self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# --- Worker Processes ---
+
+class SharedProgress(Progress):
+    # Workers add into a shared-memory counter, a watcher thread here redraws
+    def __init__(self, total, **kwargs):
+        super().__init__(total, **kwargs)
+        self.shared = Value("q", 0)
+        self._stop = Event()
+        self._thread = Thread(target=self._watch, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def add(self, n=1):
+        # Rows settled in the parent (e.g. cache hits) count toward the same bar
+        with self.shared.get_lock():
+            self.shared.value += n
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            self.set(self.shared.value)
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.count = self.shared.value
+        super().close()
+
+class BatchedCounter:
+    def __init__(self, shared, flush_every=FLUSH_EVERY):
+        self.shared = shared
+        self.flush_every = flush_every
+        self.pending = 0
+
+    def add(self, n=1):
+        self.pending += n
+        if self.pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            with self.shared.get_lock():
+                self.shared.value += self.pending
+            self.pending = 0
+
+_worker_counter = None
+
+def init_worker(shared, flush_every=FLUSH_EVERY):
+    # Pool initializer: shared Values can only reach workers through initargs
+    global _worker_counter
+    _worker_counter = BatchedCounter(shared, flush_every)
+
+def worker_update(n=1):
+    if _worker_counter is not None:
+        _worker_counter.add(n)
+
+def worker_flush():
+    if _worker_counter is not None:
+        _worker_counter.flush()
@@ -1,10 +1,14 @@
 #test_matching
-import pandas as pd
-import re
-from rapidfuzz import fuzz
-from collections import defaultdict
+import numpy as np
+from rapidfuzz import fuzz, process
+from collections import Counter, defaultdict
 from time import perf_counter
-import sys
+from progress import Progress
+from keyword_matcher import compile_keyword_tokens, has_keyword_token
+from address_normalizer import normalize_tier1, normalize_many
+from excel_cache import read_sheet
+
+CDIST_WORKERS = -1  # all cores for the batched token_set_ratio
 
 # Keywords to recognize buildings
 building_keywords = [
@@ -41,39 +45,42 @@ common_tokens = {
 
 # Helper functions
 def clean_string(text):
-    if not isinstance(text, str):
-        return ""
-    cleaned = (
-        text.replace(",", " ").replace(".", " ").replace("_", " ")
-        .replace(";", " ").replace("'", " ").replace("{", " ")
-        .replace("}", " ").replace("[", " ").replace("]", " ")
-        .replace("\\", " ").replace("?", " ").replace("!", " ")
-        .replace("*", " ").replace(":", " ").replace("\n", " ")
-        .replace("taman", "tmn").replace("lorong", "lrg")
-        .replace("kampung", "kg").replace("jalan", "jln")
-    )
-    return remove_repetitive_words(cleaned.lower().strip())
-
-def remove_repetitive_words(s):
-    words = s.split()
-    seen = set()
-    return " ".join([w for w in words if not (w in seen or seen.add(w))])
+    return normalize_tier1(text)
 
 def has_primary_token_overlap(tokens1, tokens2):
     return any(tok in tokens2 for tok in tokens1 if tok not in common_tokens and len(tok) > 2)
 
+BUILDING_TOKENS = compile_keyword_tokens(building_keywords)
+
 def has_building_keyword(text):
-    text_tokens = set(text.lower().split())
-    return any(set(kw.lower().split()) & text_tokens for kw in building_keywords)
-
-def show_progress(current, total, start_time):
-    percent = (current + 1) / total
-    bar_len = 30
-    filled_len = int(bar_len * percent)
-    bar = '█' * filled_len + '-' * (bar_len - filled_len)
-    elapsed = perf_counter() - start_time
-    sys.stdout.write(f'\r⏳ [{bar}] {int(percent * 100)}%  ({current + 1}/{total}) — Elapsed: {round(elapsed, 1)}s')
-    sys.stdout.flush()
+    return has_keyword_token(text, BUILDING_TOKENS)
+
+# --- Reference subset index ---
+# Both fallback checks (generic: address and area tokens, otherwise: full key
+# tokens) come down to "every ref token is in the input". Each ref is filed
+# under its rarest token, since the input has to contain that one, so a probe
+# only looks at refs sharing a token with the input.
+def build_subset_index(token_sets):
+    freq = Counter(tok for tokens in token_sets for tok in tokens)
+    by_token = defaultdict(list)
+    always = []  # empty token sets are contained in every input
+    for i, tokens in enumerate(token_sets):
+        if tokens:
+            by_token[min(tokens, key=lambda t: (freq[t], t))].append(i)
+        else:
+            always.append(i)
+    return by_token, always
+
+def first_subset(index, token_sets, tokens_input):
+    # Lowest position wins, same as the linear scan breaking on the first match
+    by_token, always = index
+    candidates = list(always)
+    for tok in tokens_input:
+        candidates.extend(by_token.get(tok, ()))
+    for i in sorted(candidates):
+        if token_sets[i] <= tokens_input:
+            return i
+    return None
 
 # --- Remove duplicate postcode from end of matched key ---
 def remove_duplicate_postcode(match_key, postcode):
@@ -84,11 +91,37 @@ def remove_duplicate_postcode(match_key, postcode):
         return " ".join(parts[:-1])
     return match_key
 
+def best_node_match(cleaned_address, nodes, ratios):
+    # ratios: token_set_ratio / 100 of the address against each node, 0 below 0.75
+    tokens_input = set(cleaned_address.split())
+    input_building = has_building_keyword(cleaned_address)
+    best_match = None
+    for j, node in enumerate(nodes):
+        if not has_primary_token_overlap(node["tokens"], tokens_input):
+            continue
+
+        jaccard = len(tokens_input & node["tokens"]) / len(node["tokens"] or [1])
+        if jaccard < 0.75:
+            continue
+
+        ratio = ratios[j]
+        if ratio < 0.75:
+            continue
+
+        boost = 0.10 if input_building and node["is_building"] else 0
+        penalty = 0.05 if input_building != node["is_building"] else 0
+
+        score = (0.7 * jaccard + 0.3 * ratio + boost - penalty) * 100
+
+        if not best_match or score > best_match["score"]:
+            best_match = {**node, "score": round(score)}
+    return best_match
+
 def match_address_to_latlong(filepath):
     start_time = perf_counter()
-    df_input = pd.read_excel(filepath, sheet_name='Input')
-    df_nodes = pd.read_excel(filepath, sheet_name='Nodes')
-    df_ref = pd.read_excel(filepath, sheet_name='Reference')
+    df_input = read_sheet(filepath, sheet_name='Input')
+    df_nodes = read_sheet(filepath, sheet_name='Nodes', usecols=[0, 1, 2])
+    df_ref = read_sheet(filepath, sheet_name='Reference', usecols=["Address", "Area", "Postcode", "LL"])
 
     for col in ["LL", "Matched Key", "Score"]:
         if col not in df_input.columns:
@@ -123,6 +156,9 @@ def match_address_to_latlong(filepath):
             "is_generic": is_generic
         })
 
+    ref_tokens = [ref["tokens"] for ref in reference_map]
+    ref_index = build_subset_index(ref_tokens)
+
     # Node map
     postcode_node_map = defaultdict(list)
     for _, row in df_nodes.iterrows():
@@ -136,71 +172,65 @@ def match_address_to_latlong(filepath):
             "postcode": postcode,
             "ll": ll,
             "cleaned_key": cleaned_key,
-            "tokens": tokens
+            "tokens": tokens,
+            "is_building": has_building_keyword(cleaned_key)
         })
 
     total = len(df_input)
-
-    for idx, row in df_input.iterrows():
-        raw_address = str(row.get("full_address", ""))
-        postcode = str(row.get("postcode", ""))
-        cleaned_address = clean_string(raw_address)
+    progress = Progress(total, desc="Matching")
+    cleaned_addresses = normalize_many(df_input["full_address"].astype(str), "tier1")
+    postcodes = df_input["postcode"].astype(str) if "postcode" in df_input.columns else {}
+
+    # Each distinct address of a postcode against that postcode's nodes in one
+    # cdist call, one postcode at a time so only its ratio block is held
+    groups = defaultdict(dict)  # postcode -> {cleaned address: row in its ratio block}
+    for idx in df_input.index:
+        inputs = groups[postcodes.get(idx, "")]
+        inputs.setdefault(cleaned_addresses[idx], len(inputs))
+    node_matches = {}  # (postcode, cleaned address) -> best node match or None
+    for postcode, inputs in groups.items():
+        nodes = postcode_node_map.get(postcode, [])
+        if not nodes:
+            continue
+        ratios = process.cdist(
+            list(inputs),
+            [node["cleaned_key"] for node in nodes],
+            scorer=fuzz.token_set_ratio,
+            score_cutoff=75,
+            dtype=np.float64,
+            workers=CDIST_WORKERS,
+        ) / 100
+        for cleaned_address, i in inputs.items():
+            node_matches[(postcode, cleaned_address)] = best_node_match(cleaned_address, nodes, ratios[i])
+
+    for idx, row in progress.track(df_input.iterrows()):
+        postcode = postcodes.get(idx, "")
+        cleaned_address = cleaned_addresses[idx]
         tokens_input = set(cleaned_address.split())
 
-        best_match = None
-        candidates = postcode_node_map.get(postcode, [])
-
         # Match from Nodes
-        for node in candidates:
-            if not has_primary_token_overlap(node["tokens"], tokens_input):
-                continue
-
-            jaccard = len(tokens_input & node["tokens"]) / len(node["tokens"] or [1])
-            if jaccard < 0.75:
-                continue
-
-            ratio = fuzz.token_set_ratio(cleaned_address, node["cleaned_key"]) / 100
-            if ratio < 0.75:
-                continue
-
-            boost = 0.10 if has_building_keyword(cleaned_address) and has_building_keyword(node["cleaned_key"]) else 0
-            penalty = 0.05 if has_building_keyword(cleaned_address) != has_building_keyword(node["cleaned_key"]) else 0
-
-            score = (0.7 * jaccard + 0.3 * ratio + boost - penalty) * 100
-
-            if not best_match or score > best_match["score"]:
-                best_match = {**node, "score": round(score)}
-
+        best_match = node_matches.get((postcode, cleaned_address))
         if best_match and best_match["score"] >= 83:
             df_input.at[idx, "LL"] = best_match["ll"]
             df_input.at[idx, "Matched Key"] = f"{best_match['key']} {best_match['postcode']}"
             df_input.at[idx, "Score"] = best_match["score"]
-            show_progress(idx, total, start_time)
+            progress.metrics["nodes"] += 1
             continue
 
         # Match from Reference (fallback)
-        for ref in reference_map:
-            if ref["is_generic"]:
-                if not all(tok in tokens_input for tok in ref["address"].split()):
-                    continue
-                if not all(tok in tokens_input for tok in ref["area"].split()):
-                    continue
-            else:
-                if len(tokens_input & ref["tokens"]) != len(ref["tokens"]):
-                    continue
-
+        ref_pos = first_subset(ref_index, ref_tokens, tokens_input)
+        if ref_pos is not None:
+            ref = reference_map[ref_pos]
             full_key = f"{ref['address']} {ref['area']} {ref['postcode']}"
             df_input.at[idx, "LL"] = ref["ll"]
             df_input.at[idx, "Matched Key"] = full_key
             df_input.at[idx, "Score"] = 100
-            break
+            progress.metrics["reference"] += 1
         else:
             df_input.at[idx, "LL"] = ""
             df_input.at[idx, "Matched Key"] = ""
             df_input.at[idx, "Score"] = 0
 
-        show_progress(idx, total, start_time)
-
     # Fix duplicate postcode in "Matched Key"
     df_input["Matched Key"] = df_input.apply(
         lambda x: remove_duplicate_postcode(x["Matched Key"], str(x.get("postcode", "")).strip()),
@@ -213,7 +243,7 @@ def match_address_to_latlong(filepath):
     total_time = round(perf_counter() - start_time, 2)
     match_count = df_input["LL"].astype(bool).sum()
 
-    print(f"\n\n✅ Matching complete. File saved to: {out_path}")
+    print(f"\n✅ Matching complete. File saved to: {out_path}")
     print(f"⏱️ Total runtime: {total_time} seconds")
     print(f"📌 Total matched: {match_count} / {total}")
 
@@ -1,13 +1,28 @@
 import pandas as pd
+import numpy as np
 import re
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 from collections import defaultdict
 from time import perf_counter
 import os
 import ast
-import sys
+from progress import Progress
+from keyword_matcher import compile_keyword_tokens, has_keyword_token
+from match_cache import MatchCache
+from address_normalizer import normalize_alnum, normalize_basic
+from excel_cache import read_sheet
 
 start_time = None
+CDIST_WORKERS = -1  # all cores for the batched token_set_ratio
+USE_MATCH_CACHE = True  # reuse results for repeated (cleaned address, postcode) pairs across runs
+
+# Node scoring
+JACCARD_THRESHOLD = 0.60  # shared tokens over node tokens
+FUZZY_THRESHOLD = 0.75
+LONG_INPUT_TOKENS = 7  # inputs this long must share at least LONG_INPUT_OVERLAP tokens
+LONG_INPUT_OVERLAP = 5
+SCORE_SCALE = 1.1  # divides the boosted score so only strong matches clear SCORE_THRESHOLD
+SCORE_THRESHOLD = 90
 
 building_keywords = [
     "pangsapuri", "apartment", "kondominium", "flat", "rumah pangsa", "perumahan",
@@ -29,43 +44,19 @@ common_tokens = {
     "kuching", "sarawak"
 }
 
-def print_progress(current, total, start_time):
-    percent = (current + 1) / total
-    bar_len = 15
-    filled_len = int(bar_len * percent)
-    bar = '█' * filled_len + '-' * (bar_len - filled_len)
-    elapsed = perf_counter() - start_time
-    eta = (elapsed / (percent + 1e-5)) * (1 - percent)
-    mins = int(elapsed // 60)
-    secs = round(elapsed % 60)
-    eta_m = int(eta // 60)
-    eta_s = int(eta % 60)
-    sys.stdout.write(
-        f'\rProgress: {current + 1} / {total} ({int(percent * 100)}%)'
-        f' | ⏱️ {mins:02d}:{secs:02d} | ETA: {eta_m:02d}:{eta_s:02d} | [{bar}]'
-    )
-    sys.stdout.flush()
-
 def clean_address(text):
-    if not isinstance(text, str):
-        return ""
-    text = text.lower()
-    text = re.sub(r"[^a-z0-9\s/]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    return normalize_alnum(text)
 
 def clean_string(s):
-    s = str(s).lower()
-    s = re.sub(r"[^\w\s/]", " ", s)
-    s = re.sub(r"\s+", " ", s)
-    return s.strip()
+    return normalize_basic(s)
 
 def has_primary_token_overlap(tokens1, tokens2):
     return any(tok in tokens2 for tok in tokens1 if tok not in common_tokens and len(tok) > 2)
 
+BUILDING_TOKENS = compile_keyword_tokens(building_keywords)
+
 def has_building_keyword(text):
-    text_tokens = set(text.lower().split())
-    return any(set(kw.lower().split()) & text_tokens for kw in building_keywords)
+    return has_keyword_token(text, BUILDING_TOKENS)
 
 def remove_duplicate_postcode(text):
     return re.sub(r'(\b\d{5}\b)(\s+\1)+', r'\1', text)
@@ -78,49 +69,121 @@ def is_generic_match(key):
     except:
         return False
 
-def run_tier1(df_input, postcode_node_map):
-    results = []
-    for idx, row in df_input.iterrows():
-        raw_address = str(row.get("full_address", ""))
+def build_node_map(df_nodes):
+    postcode_node_map = defaultdict(list)
+    for _, row in df_nodes.iterrows():
+        key = str(row.iloc[0] or "")
+        postcode = str(row.iloc[1] or "")
+        ll = row.iloc[2]
+        cleaned_key = clean_string(key)
+        tokens = set(cleaned_key.split())
+        postcode_node_map[postcode].append({
+            "key": key,
+            "postcode": postcode,
+            "ll": ll,
+            "cleaned_key": cleaned_key,
+            "tokens": tokens,
+            "is_building": has_building_keyword(cleaned_key)
+        })
+    return postcode_node_map
+
+def open_match_cache(df_nodes):
+    if not USE_MATCH_CACHE:
+        return None
+    return MatchCache("tier1", {
+        "nodes": str(pd.util.hash_pandas_object(df_nodes.astype(str), index=False).sum()),
+        "building_keywords": building_keywords,
+        "common_tokens": sorted(common_tokens),
+        "thresholds": (JACCARD_THRESHOLD, FUZZY_THRESHOLD, LONG_INPUT_TOKENS, LONG_INPUT_OVERLAP, SCORE_SCALE, SCORE_THRESHOLD),
+    })
+
+def run_tier1(df_input, postcode_node_map, cache=None, cleaned_addresses=None):
+    # cleaned_addresses: clean_address of each row, when the caller already has them
+    results = [("", "", 0, "")] * len(df_input)
+    progress = Progress(len(df_input), desc="Tier 1", bar_len=15)
+
+    # Row positions per (cleaned address, postcode), each pair is scored once and fanned out
+    positions = defaultdict(list)
+    for pos, (_, row) in enumerate(df_input.iterrows()):
         postcode = str(row.get("postcode", ""))
-        cleaned = clean_address(raw_address)
-        tokens_input = set(cleaned.split())
-
-        best = None
-        for node in postcode_node_map.get(postcode, []):
-            if not has_primary_token_overlap(node["tokens"], tokens_input):
-                continue
-            overlap = len(tokens_input & node["tokens"])
-            jaccard = overlap / len(node["tokens"] or [1])
-            if len(tokens_input) >= 7 and overlap < 5:
-                continue
-            if jaccard < 0.60:
-                continue
-            ratio = fuzz.token_set_ratio(cleaned, node["cleaned_key"]) / 100
-            if ratio < 0.75:
-                continue
-            boost = 0.10 if has_building_keyword(cleaned) and has_building_keyword(node["cleaned_key"]) else 0
-            penalty = 0.05 if has_building_keyword(cleaned) != has_building_keyword(node["cleaned_key"]) else 0
-            score = ((0.7 * jaccard + 0.3 * ratio + boost - penalty) / 1.1) * 100
-            if not best or score > best.get("score", 0):
-                best = {
-                    "ll": node["ll"],
-                    "matched_key": remove_duplicate_postcode(f"{node['key']} {node['postcode']}"),
-                    "score": round(score),
-                    "source": "Nodes"
-                }
-        if best and best["score"] >= 90:
-            results.append((best["ll"], best["matched_key"], best["score"], best["source"]))
+        if cleaned_addresses is None:
+            cleaned = clean_address(str(row.get("full_address", "")))
         else:
-            results.append(("", "", 0, ""))
-        print_progress(idx, len(df_input), start_time)
+            cleaned = cleaned_addresses[pos]
+        positions[(cleaned, postcode)].append(pos)
+
+    known = {key: tuple(result) for key, result in cache.get_many(set(positions)).items()} if cache else {}
+    for key, result in known.items():
+        for pos in positions[key]:
+            results[pos] = result
+        if result[3]:
+            progress.metrics["matched"] += len(positions[key])
+        progress.update(len(positions[key]))
+
+    # Rows sharing a postcode are scored against that postcode's nodes in one cdist call
+    groups = defaultdict(list)
+    for cleaned, postcode in positions:
+        if (cleaned, postcode) not in known:
+            groups[postcode].append(cleaned)
+
+    fresh = {}
+    for postcode, inputs in groups.items():
+        nodes = postcode_node_map.get(postcode, [])
+        if nodes:
+            ratios = process.cdist(
+                inputs,
+                [node["cleaned_key"] for node in nodes],
+                scorer=fuzz.token_set_ratio,
+                score_cutoff=FUZZY_THRESHOLD * 100,
+                dtype=np.float64,
+                workers=CDIST_WORKERS,
+            )
+
+        for i, cleaned in enumerate(inputs):
+            tokens_input = set(cleaned.split())
+            input_building = has_building_keyword(cleaned)
+            best = None
+            for j, node in enumerate(nodes):
+                if not has_primary_token_overlap(node["tokens"], tokens_input):
+                    continue
+                overlap = len(tokens_input & node["tokens"])
+                jaccard = overlap / len(node["tokens"] or [1])
+                if len(tokens_input) >= LONG_INPUT_TOKENS and overlap < LONG_INPUT_OVERLAP:
+                    continue
+                if jaccard < JACCARD_THRESHOLD:
+                    continue
+                ratio = ratios[i, j] / 100
+                if ratio < FUZZY_THRESHOLD:
+                    continue
+                boost = 0.10 if input_building and node["is_building"] else 0
+                penalty = 0.05 if input_building != node["is_building"] else 0
+                score = ((0.7 * jaccard + 0.3 * ratio + boost - penalty) / SCORE_SCALE) * 100
+                if not best or score > best.get("score", 0):
+                    best = {
+                        "ll": node["ll"],
+                        "matched_key": remove_duplicate_postcode(f"{node['key']} {node['postcode']}"),
+                        "score": round(score),
+                        "source": "Nodes"
+                    }
+            key = (cleaned, postcode)
+            fresh[key] = ("", "", 0, "")
+            if best and best["score"] >= SCORE_THRESHOLD:
+                fresh[key] = (best["ll"], best["matched_key"], best["score"], best["source"])
+                progress.metrics["matched"] += len(positions[key])
+            for pos in positions[key]:
+                results[pos] = fresh[key]
+            progress.update(len(positions[key]))
+
+    if cache:
+        cache.put_many(fresh)
+    progress.close()
     return results
 
 def match_address_to_latlong(filepath):
     global start_time
     start_time = perf_counter()
-    df_input = pd.read_excel(filepath, sheet_name='Input')
-    df_nodes = pd.read_excel(filepath, sheet_name='Nodes')
+    df_input = read_sheet(filepath, sheet_name='Input')
+    df_nodes = read_sheet(filepath, sheet_name='Nodes', usecols=[0, 1, 2])
 
     if "Matched Key" in df_input.columns:
         df_input = df_input[~df_input["Matched Key"].apply(is_generic_match)]
@@ -129,23 +192,11 @@ def match_address_to_latlong(filepath):
         if col not in df_input.columns:
             df_input[col] = "" if col != "Score" else 0
 
-    postcode_node_map = defaultdict(list)
-    for _, row in df_nodes.iterrows():
-        key = str(row.iloc[0] or "")
-        postcode = str(row.iloc[1] or "")
-        ll = row.iloc[2]
-        cleaned_key = clean_string(key)
-        tokens = set(cleaned_key.split())
-        postcode_node_map[postcode].append({
-            "key": key,
-            "postcode": postcode,
-            "ll": ll,
-            "cleaned_key": cleaned_key,
-            "tokens": tokens
-        })
+    postcode_node_map = build_node_map(df_nodes)
+    cache = open_match_cache(df_nodes)
 
     print("\n🔍 Running Tier 1 (Nodes)...")
-    tier1_results = run_tier1(df_input, postcode_node_map)
+    tier1_results = run_tier1(df_input, postcode_node_map, cache)
     df_input[["LL", "Matched Key", "Score", "Source"]] = tier1_results
 
     df_input = df_input[df_input["Score"] >= 75]
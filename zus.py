@@ -1,15 +1,12 @@
-import pandas as pd
-import re
+import math
 from rapidfuzz import fuzz
 from time import perf_counter
-from collections import Counter
+from collections import Counter, defaultdict
 from datetime import timedelta
-
-try:
-    from tqdm import tqdm
-    use_tqdm = True
-except ImportError:
-    use_tqdm = False
+from progress import Progress
+from keyword_matcher import compile_keyword_pattern, has_keyword_phrase, KeywordAutomaton
+from address_normalizer import normalize_abbrev, normalize_many
+from excel_cache import read_sheet
 
 common_tokens = {
     "kuala", "lumpur", "selangor", "malaysia", "my", "jalan", "jln", "kg", "tmn", "wp", "wilayah", "persekutuan"
@@ -22,91 +19,32 @@ area_keywords = [
 ]
 
 def load_building_keywords(filepath):
-    df_building = pd.read_excel(filepath, sheet_name='building_keywords')
+    df_building = read_sheet(filepath, sheet_name='building_keywords')
     keywords = set()
     for col in df_building.columns:
         col_keywords = df_building[col].dropna().astype(str).tolist()
         keywords.update([k.lower().strip() for k in col_keywords if k.strip()])
     return list(keywords)
 
-def has_building_keyword(text, keywords):
-    return any(kw in text for kw in keywords)
+def has_building_keyword(text, building_pattern):
+    return has_keyword_phrase(text, building_pattern)
 
 def clean_string(text):
-    if not isinstance(text, str):
-        return ""
-    cleaned = (
-        text.replace(",", " ").replace(".", " ").replace("_", " ")
-            .replace(";", " ").replace("'", " ").replace("{", " ")
-            .replace("}", " ").replace("[", " ").replace("]", " ")
-            .replace("\\", " ").replace("?", " ").replace("!", " ")
-            .replace("*", " ").replace(":", " ").replace("\n", " ")
-            .lower()
-    )
-    replacements = {
-        "sekolah menengah kebangsaan": "smk",
-        "sekolah menengah": "smk",
-        "sekolah kebangsaan": "sk",
-        "sekolah rendah kebangsaan": "srk",
-        "sekolah rendah": "sk",
-        "sekolah jenis kebangsaan": "sjk",
-        "sekolah agama": "sra",
-        "kolej vokasional": "kv",
-        "kolej komuniti": "kk",
-        "kolej matrikulasi": "km",
-        "universiti teknologi mara": "uitm",
-        "universiti kebangsaan malaysia": "ukm",
-        "universiti teknologi malaysia": "utm",
-        "universiti sains malaysia": "usm",
-        "universiti putra malaysia": "upm",
-        "universiti malaysia sabah": "ums",
-        "universiti malaya": "um",
-        "maktab rendah sains mara": "mrsm",
-        "jalan": "jln",
-        "lorong": "lrg",
-        "kampung": "kg",
-        "taman": "tmn"
-    }
-    for long, abbr in replacements.items():
-        cleaned = re.sub(rf"\b{re.escape(long)}\b", abbr, cleaned)
-    match = re.search(r"(.*?)(\d+)$", cleaned)
-    if match:
-        alpha_part = match.group(1)
-        numeric_part = remove_repetitive_numbers(match.group(2))
-        cleaned = f"{alpha_part} {numeric_part}"
-    cleaned = remove_repetitive_words(cleaned)
-    return cleaned.strip()
-
-def remove_repetitive_numbers(s):
-    return re.sub(r"(\d+)\s+\1", r"\1", s)
-
-def remove_repetitive_words(s):
-    words = s.lower().split()
-    seen = set()
-    return " ".join([w for w in words if not (w in seen or seen.add(w))])
-
-def detect_area_conflict(input_text, node_text):
-    input_text = input_text.lower()
-    node_text = node_text.lower()
-    input_areas = [kw for kw in area_keywords if kw in input_text]
-    node_areas = [kw for kw in area_keywords if kw in node_text]
-    if input_areas and node_areas:
-        return set(input_areas) != set(node_areas)
-    return False
-
-def contains_key_after_noise(cleaned_address, cleaned_key):
-    try:
-        pos = cleaned_address.index(cleaned_key)
-        return pos > 0
-    except ValueError:
-        return False
+    return normalize_abbrev(text)
+
+def find_areas(text):
+    text = text.lower()
+    return frozenset(kw for kw in area_keywords if kw in text)
+
+def detect_area_conflict(input_areas, node_areas):
+    return bool(input_areas and node_areas and input_areas != node_areas)
 
 def match_address_to_latlong(filepath):
     start_time = perf_counter()
 
-    df_input = pd.read_excel(filepath, sheet_name='Input')
-    df_nodes = pd.read_excel(filepath, sheet_name='Reference')
-    building_keywords = load_building_keywords(filepath)
+    df_input = read_sheet(filepath, sheet_name='Input')
+    df_nodes = read_sheet(filepath, sheet_name='Reference', usecols=[0, 1, 2])
+    building_pattern = compile_keyword_pattern(load_building_keywords(filepath))
 
     for col in ["LL", "Matched Key", "Score"]:
         if col not in df_input.columns:
@@ -126,33 +64,58 @@ def match_address_to_latlong(filepath):
             "key": key,
             "ll": ll,
             "cleaned_key": cleaned_key,
-            "tokens": tokens
+            "tokens": tokens,
+            "is_building": has_building_keyword(cleaned_key, building_pattern),
+            "areas": find_areas(cleaned_key),
+            "branded": len(cleaned_key.split()) >= 3 and ("pavilion" in cleaned_key or "damansara" in cleaned_key)
         })
 
+    # Every cleaned key in one automaton, so the exact phase scans each address once
+    key_automaton = KeywordAutomaton(node["cleaned_key"] for node in node_pool)
+
+    # Prefix filter: a node of n tokens reaching jaccard 0.6 shares at least
+    # ceil(0.6 * n) of them with the input, so it shares one of its
+    # n - ceil(0.6 * n) + 1 rarest tokens. Nodes are filed under only those.
+    freq = Counter(tok for node in node_pool for tok in node["tokens"])
+    token_nodes = defaultdict(list)
+    for i, node in enumerate(node_pool):
+        prefix = len(node["tokens"]) - math.ceil(0.6 * len(node["tokens"])) + 1
+        for tok in sorted(node["tokens"], key=lambda t: (freq[t], t))[:prefix]:
+            token_nodes[tok].append(i)
+
     total = len(df_input)
-    iterable = tqdm(df_input.iterrows(), total=total, desc="🔄 Matching") if use_tqdm else enumerate(df_input.iterrows())
+    progress = Progress(total, desc="🔄 Matching")
+    cleaned_addresses = normalize_many(df_input["full_address"].astype(str), "abbrev")
 
-    for idx, row in iterable:
-        raw_address = str(row.get("full_address", ""))
-        cleaned_address = clean_string(raw_address)
+    for idx, row in progress.track(df_input.iterrows()):
+        cleaned_address = cleaned_addresses[idx]
         tokens_input = set(cleaned_address.split())
-
-        found = False
-        for node in node_pool:
-            if contains_key_after_noise(cleaned_address, node["cleaned_key"]):
-                df_input.at[idx, "LL"] = node["ll"]
-                df_input.at[idx, "Matched Key"] = node["key"]
-                df_input.at[idx, "Score"] = 100
-                found = True
-                break
-        if found:
+        input_building = has_building_keyword(cleaned_address, building_pattern)
+
+        # Key after noise: the key occurs but the address does not start with it,
+        # i.e. its first occurrence is past position 0. The first such node wins.
+        exact = [
+            i for i in key_automaton.find_all(cleaned_address)
+            if not cleaned_address.startswith(node_pool[i]["cleaned_key"])
+        ]
+        if exact:
+            node = node_pool[min(exact)]
+            df_input.at[idx, "LL"] = node["ll"]
+            df_input.at[idx, "Matched Key"] = node["key"]
+            df_input.at[idx, "Score"] = 100
             continue
 
+        # Candidates from the prefix postings, checked against their full token
+        # set; nodes are visited in dictionary order so ties still go to the first node
+        candidates = set()
+        for tok in tokens_input:
+            candidates.update(token_nodes.get(tok, ()))
+        input_areas = find_areas(cleaned_address)
+
         best_match = None
-        for node in node_pool:
-            tokens_node = node["tokens"]
-            intersection = tokens_input & tokens_node
-            jaccard = len(intersection) / len(tokens_node) if tokens_node else 0
+        for i in sorted(candidates):
+            node = node_pool[i]
+            jaccard = len(tokens_input & node["tokens"]) / len(node["tokens"])
             if jaccard < 0.6:
                 continue
 
@@ -166,15 +129,15 @@ def match_address_to_latlong(filepath):
             if node["cleaned_key"] in cleaned_address:
                 score += 10  # boost for substring presence
 
-            if len(node["cleaned_key"].split()) >= 3 and ("pavilion" in node["cleaned_key"] or "damansara" in node["cleaned_key"]):
+            if node["branded"]:
                 score += 5  # boost for detailed or branded name
 
-            if has_building_keyword(cleaned_address, building_keywords) and has_building_keyword(node["cleaned_key"], building_keywords):
+            if input_building and node["is_building"]:
                 score += 10
-            elif has_building_keyword(cleaned_address, building_keywords) != has_building_keyword(node["cleaned_key"], building_keywords):
+            elif input_building != node["is_building"]:
                 score -= 5
 
-            if detect_area_conflict(cleaned_address, node["cleaned_key"]):
+            if detect_area_conflict(input_areas, node["areas"]):
                 score -= 5
 
             if not best_match or score > best_match["score"]: